@@ -1,11 +1,32 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+import ast
 import csv
-from bson import ObjectId
+import gzip
+import hashlib
+import io
+import json
+import operator
+import os
+from bson import Decimal128, ObjectId, json_util
 import schedule
 import time
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate, chain, islice, repeat
 from bson.binary import Binary
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
 # Connexion à la bdd MongoDB
 client = MongoClient("mongodb://localhost:27017")
 # bdd de test
@@ -22,99 +43,149 @@ def binary_id_to_str(id):
     return str(id)
 
 # Importer en CSV
-def import_data_from_csv(filename: str, collection_name: str) -> None:
+# Nombre de lignes du CSV insérées dans MongoDB par requête
+IMPORT_BATCH_SIZE = 1000
+
+def split_list(value: str) -> list:
+    """
+    Convertit une liste stockée dans le CSV sous la forme "a,b,c" en liste Python
+    """
+    return value.split(',') if value else []
+
+# Valeurs vides très fréquentes dans la colonne comments, reconnues sans les parser
+EMPTY_LISTS = frozenset(("", "[]"))
+
+def parse_structured(value: str):
+    """
+    Convertit une liste ou un dictionnaire écrit dans le CSV en valeur Python, sans jamais exécuter de code:
+    JSON (le format écrit par l'export), ou à défaut une valeur littérale Python (anciens fichiers en repr)
+
+    Lève:
+        ValueError: Si la valeur n'est ni du JSON ni une valeur littérale Python
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError(f"Valeur illisible: {value[:50]}") from None
+
+def parse_comments(value: str) -> list:
+    if value in EMPTY_LISTS:
+        return []
+    comments = parse_structured(value)
+    if not isinstance(comments, list):
+        raise ValueError(f"Les commentaires doivent être une liste: {value[:50]}")
+    return comments
+
+# Schéma de chaque collection pour l'import: champ unique qui permet de vérifier si le document existe déjà
+# (None pour posts et privates_messages car il peut en avoir plusieurs identiques)
+# et fonction de conversion de chaque colonne du CSV
+IMPORT_SCHEMAS = {
+    "users": ("mail", {
+        "username": str,
+        "avatar": str,
+        "bio": str,
+        "interests": split_list,
+        "first_name": str,
+        "last_name": str,
+        "mail": str,
+        "password": str,
+        "role": str,
+        "birthdate": str,
+        "friends": split_list,
+        "groups": split_list,
+        "pages": split_list,
+        "createdAt": str,
+    }),
+    "group": ("name", {
+        "name": str,
+        "description": str,
+        "members": split_list,
+        "createdBy": str,
+        "createdAt": str,
+    }),
+    "posts": (None, {
+        "userId": str,
+        "content": str,
+        "image": str,
+        "likes": split_list,
+        "comments": parse_comments,
+        "createdAt": str,
+    }),
+    "privates_messages": (None, {
+        "sender_id": str,
+        "receiver_id": str,
+        "content": str,
+        "createdAt": str,
+    }),
+    "pages": ("name", {
+        "name": str,
+        "description": str,
+        "followers": split_list,
+        "createdBy": str,
+        "createdAt": str,
+    }),
+}
+
+def import_data_from_csv(filename: str, collection_name: str, batch_size: int = IMPORT_BATCH_SIZE) -> None:
     """
     Importation des données à partir d'un fichier CSV dans la collection collection_name
-    On n'importe pas un document s'il existe déjà, on vérifie avec son id
+    On n'importe pas un document s'il existe déjà, on vérifie avec son champ unique
     
     Args:
         filename (str): Le nom du fichier CSV contenant les données à importer
         collection_name (str): Le nom de la collection
+        batch_size (int): Le nombre de lignes insérées par requête
 
     Retourne:
         None
 
     Fonctionnement:
-        - Lit le fichier CSV ligne par ligne
-        - Crée un document adapté au schéma de la collection collection_name
-        - Vérifie si le document existe déjà
-        - Insère uniquement les documents qui n'existent pas dans la collection
+        - Lit le fichier CSV par paquets de batch_size lignes
+        - Crée les documents adaptés au schéma de la collection collection_name (IMPORT_SCHEMAS)
+        - Vérifie en une seule requête $in quels documents du paquet existent déjà
+        - Insère en une seule requête les documents qui n'existent pas dans la collection
     """
+    if collection_name not in IMPORT_SCHEMAS:
+        print(f"La collection {collection_name} n'existe pas")
+        return
+    unique_field, schema = IMPORT_SCHEMAS[collection_name]
+
+    start = time.perf_counter()
+    rows_count = 0
+    inserted_count = 0
     with open(filename, 'r', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            # On récupère un champs unique qui permettra de vérifier si le document existe déjà
-            if collection_name == "users":
-                unique_field = {"mail": row['mail']}
-            elif collection_name == "group":
-                unique_field = {"name": row['name']}
-            elif collection_name == "pages":
-                unique_field = {"name": row['name']}
-            elif collection_name in ["posts", "privates_messages"]:
-                # Pas besoin de vérifier pour posts et privates_messages car il peut en avoir plusieurs identiques
-                unique_field = None
-            else:
-                print(f"La collection {collection_name} n'existe pas")
-                return
-
-            # Vérifie si le document existe déjà et on l'ignore si existe déjà
-            if db[collection_name].find_one(unique_field):
-                continue
+        while True:
+            rows = list(islice(reader, batch_size))
+            if not rows:
+                break
+            rows_count += len(rows)
+
+            documents = [{field: parse(row[field]) for field, parse in schema.items()} for row in rows]
+
+            if unique_field:
+                # On ignore les documents qui existent déjà, et les doublons à l'intérieur du fichier
+                seen = {document[unique_field] for document in db[collection_name].find(
+                    {unique_field: {"$in": [document[unique_field] for document in documents]}},
+                    {unique_field: 1, "_id": 0})}
+                new_documents = []
+                for document in documents:
+                    if document[unique_field] not in seen:
+                        seen.add(document[unique_field])
+                        new_documents.append(document)
+                documents = new_documents
 
-            # Création du document en fonction de la collection
-            if collection_name == "users":
-                document = {
-                    "username": row['username'],
-                    "avatar": row['avatar'],
-                    "bio": row['bio'],
-                    "interests": row['interests'].split(',') if row['interests'] else [],
-                    "first_name": row['first_name'],
-                    "last_name": row['last_name'],
-                    "mail": row['mail'],
-                    "password": row['password'],
-                    "role": row['role'],
-                    "birthdate": row['birthdate'],
-                    "friends": row['friends'].split(',') if row['friends'] else [],
-                    "groups": row['groups'].split(',') if row['groups'] else [],
-                    "pages": row['pages'].split(',') if row['pages'] else [],
-                    "createdAt": row['createdAt']
-                }
-            elif collection_name == "group":
-                document = {
-                    "name": row['name'],
-                    "description": row['description'],
-                    "members": row['members'].split(',') if row['members'] else [],
-                    "createdBy": row['createdBy'],
-                    "createdAt": row['createdAt']
-                }
-            elif collection_name == "posts":
-                document = {
-                    "userId": row['userId'],
-                    "content": row['content'],
-                    "image": row['image'],
-                    "likes": row['likes'].split(',') if row['likes'] else [],
-                    "comments": eval(row['comments']) if row['comments'] else [],
-                    "createdAt": row['createdAt']
-                }
-            elif collection_name == "privates_messages":
-                document = {
-                    "sender_id": row['sender_id'],
-                    "receiver_id": row['receiver_id'],
-                    "content": row['content'],
-                    "createdAt": row['createdAt']
-                }
-            elif collection_name == "pages":
-                document = {
-                    "name": row['name'],
-                    "description": row['description'],
-                    "followers": row['followers'].split(',') if row['followers'] else [],
-                    "createdBy": row['createdBy'],
-                    "createdAt": row['createdAt']
-                }
-            
-            # Insérer le document dans la collection
-            db[collection_name].insert_one(document)
-    print("Importation csv: terminé")
+            if documents:
+                db[collection_name].insert_many(documents, ordered=False)
+                inserted_count += len(documents)
+
+    duration = time.perf_counter() - start
+    print(f"Importation csv: terminé ({inserted_count} documents insérés sur {rows_count} lignes, "
+          f"{rows_count / duration if duration else 0:.0f} lignes/s)")
 
 # On importe des données d'exemple
 """
@@ -127,6 +198,69 @@ import_data_from_csv('csv data/imports/pages_data.csv', 'pages')
 
 
 # Exporter en CSV
+# Nombre de documents récupérés par aller-retour avec MongoDB pendant l'export
+EXPORT_BATCH_SIZE = 1000
+
+def collection_fields(collection, query: dict = None) -> list:
+    """
+    Récupère la liste triée de tous les champs utilisés par les documents de la collection (ou seulement
+    par ceux qui correspondent à query). L'union est calculée par MongoDB (aggregation), aucun document
+    n'est chargé en mémoire côté Python
+    """
+    pipeline = [{"$match": query}] if query else []
+    pipeline += [
+        {"$project": {"fields": {"$objectToArray": "$$ROOT"}}},
+        {"$unwind": "$fields"},
+        {"$group": {"_id": "$fields.k"}},
+    ]
+    return sorted(field["_id"] for field in collection.aggregate(pipeline, allowDiskUse=True))
+
+def json_default(value):
+    """
+    Convertit pour json.dumps les valeurs MongoDB qui ne sont pas du JSON (Binary, ObjectId, dates)
+    """
+    if isinstance(value, Binary):
+        return binary_id_to_str(value)
+    return str(value)
+
+def write_csv_documents(csvfile, documents, all_fields: list) -> int:
+    """
+    Écrit les en-têtes puis chaque document dans un fichier CSV déjà ouvert
+
+    Retourne:
+        int: Le nombre de documents écrits
+    """
+    writer = csv.DictWriter(csvfile, fieldnames=all_fields)
+    # On écrit les en-têtes dans le csv, ceux indiqués dans le paramètre "fieldnames" du writer
+    writer.writeheader()
+
+    count = 0
+    for doc in documents:
+        row = {}
+
+        # On insère tout les champs à partir du document
+        for field in all_fields:
+            valeur = doc.get(field, '')
+            # Si un champs est de type Binary, on le converti en str car sinon il sera illisible dans le csv
+            if type(valeur) == Binary:
+                valeur = binary_id_to_str(valeur)
+
+            # Si un champs est une liste non vide, et qu'elle contient des éléments de type Binary
+            # on les convertis en str également
+            elif type(valeur) == list and len(valeur) > 0 and type(valeur[0]) == Binary:
+                valeur = [binary_id_to_str(element) for element in valeur]
+
+            # Les documents imbriqués (ex: les commentaires) sont écrits en JSON,
+            # le format relu par parse_comments() à l'import
+            elif type(valeur) == dict or (type(valeur) == list and len(valeur) > 0 and type(valeur[0]) == dict):
+                valeur = json.dumps(valeur, default=json_default, ensure_ascii=False)
+
+            row[field] = valeur
+
+        writer.writerow(row)
+        count += 1
+    return count
+
 def export_data_to_csv(filename: str, collection_name: str) -> None:
     """
     Exportation des données à partir de la collection collection_name dans un fichier CSV
@@ -139,49 +273,23 @@ def export_data_to_csv(filename: str, collection_name: str) -> None:
         None
 
     Fonctionnement:
-        - Récupère tous les documents de la collection collection_name
         - Détecte tous les champs uniques parmi les documents pour les utiliser comme en-têtes du CSV
-        - Écrit chaque document dans le fichier CSV
+        - Parcourt les documents de la collection collection_name par paquets de EXPORT_BATCH_SIZE
+        - Écrit chaque document dans le fichier CSV dès qu'il est reçu, la mémoire utilisée
+          ne dépend donc pas de la taille de la collection
     """
     collection = db[collection_name]
-    documents = list(collection.find())
-    
-    if not documents:
-        print(f"La collection {collection_name} ne contient aucun document")
-        return
 
-    # On prépare les en-têtes du CSV en parcourant tout les documents
+    # On prépare les en-têtes du CSV à partir de tout les documents
     # car certains documents peuvent avoir des champs vides
-    all_fields = set()
-    for doc in documents:
-        all_fields.update(doc.keys())
-    all_fields = sorted(all_fields)
+    all_fields = collection_fields(collection)
+
+    if not all_fields:
+        print(f"La collection {collection_name} ne contient aucun document")
+        return
 
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=all_fields)
-        # On écrit les en-têtes dans le csv, ceux indiqués dans le paramètre "fieldnames" du writer
-        writer.writeheader()
-        
-        for doc in documents:
-            row = {}
-                
-            # On insère tout les champs à partir du document, sauf _id car déjà inséré au dessus
-            for field in all_fields:
-                # Si un champs est de type Binary, on le converti en str car sinon il sera illisible dans le csv
-                if type(doc.get(field)) == Binary:
-                    valeur = binary_id_to_str(doc.get(field))
-                
-                # Si un champs est une liste non vide, et qu'elle contient des éléments de type Binary
-                # on les convertis en str également
-                elif type(doc.get(field)) == list and len(doc.get(field)) > 0 and type(doc.get(field)[0]) == Binary:
-                    valeur = [binary_id_to_str(element) for element in doc.get(field)]
-                    print(valeur)
-                else:
-                    valeur = doc.get(field, '')
-
-                row[field] = valeur
-
-            writer.writerow(row)
+        write_csv_documents(csvfile, collection.find().batch_size(EXPORT_BATCH_SIZE), all_fields)
 
     print("Exporation CSV: terminé")
 
@@ -194,23 +302,676 @@ export_data_to_csv('csv data/exports/privates_messages_export.csv', 'privates_me
 export_data_to_csv('csv data/exports/pages_export.csv', 'pages')"""
 
 
+# Exporter et importer en Parquet (format en colonnes)
+# Nombre de documents par row group du fichier Parquet
+PARQUET_ROW_GROUP_SIZE = 50_000
+# Type de chaque colonne Parquet, par collection:
+#   "id" / "ids": identifiant ou liste d'identifiants, les Binary sont stockés tels quels (sans conversion hex)
+#                 avec leur sous-type, les ObjectId et les id en texte avec leur type
+#   "string" / "strings": texte ou liste de textes
+#   "timestamp": date MongoDB (les dates en texte vont dans la colonne de repli)
+#   "comments": liste de commentaires {user_id, comment}
+#   "json": n'importe quelle valeur, stockée en JSON étendu MongoDB (bson.json_util)
+# Les champs absents de ce dictionnaire sont stockés en "json"
+PARQUET_COLUMNS = {
+    "users": {
+        "_class": "string", "_id": "id", "avatar": "string", "bio": "string", "birthdate": "timestamp",
+        "createdAt": "timestamp", "first_name": "string", "friends": "ids", "groups": "ids",
+        "interests": "strings", "last_name": "string", "mail": "string", "pages": "ids", "password": "string",
+        "requests_friends": "ids", "role": "string", "username": "string",
+    },
+    "group": {
+        "_class": "string", "_id": "id", "createdAt": "timestamp", "description": "string",
+        "members": "ids", "name": "string",
+    },
+    "posts": {
+        "_class": "string", "_id": "id", "comments": "comments", "content": "string", "createdAt": "timestamp",
+        "description": "string", "image": "string", "likes": "ids", "userId": "id",
+    },
+    "privates_messages": {
+        "_class": "string", "_id": "id", "content": "string", "createdAt": "timestamp",
+        "receiver_id": "id", "sender_id": "id",
+    },
+    "pages": {
+        "_class": "string", "_id": "id", "createdAt": "timestamp", "description": "string",
+        "followers": "ids", "image": "string", "name": "string",
+    },
+}
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Le module pyarrow est nécessaire pour le format Parquet (pip install pyarrow)")
+
+# Chaque colonne typée a une colonne de repli "<champ>#json": une valeur qui n'a pas le type de sa colonne
+# (ex: une date en texte "22/12/1976", un id entier) y est écrite en JSON étendu et relue telle quelle,
+# comme les champs présents à null. Aucune valeur n'est donc perdue ou change de type
+FALLBACK_SUFFIX = "#json"
+PARQUET_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+# Type d'un id dans les colonnes "id" et "ids": sous-type du Binary (0 à 255), ObjectId ou texte
+ID_OBJECTID = -1
+ID_STRING = -2
+
+class NotConvertible(ValueError):
+    """
+    La valeur n'a pas le type de sa colonne Parquet, elle est écrite dans la colonne de repli
+    """
+
+def id_type():
+    return pa.struct([("type", pa.int16()), ("value", pa.binary())])
+
+def arrow_type(kind: str):
+    comment = pa.struct([("user_id", id_type()), ("comment", pa.string())])
+    return {
+        "id": id_type(),
+        "ids": pa.list_(id_type()),
+        "string": pa.string(),
+        "strings": pa.list_(pa.string()),
+        "timestamp": pa.timestamp("ms"),
+        "comments": pa.list_(comment),
+        "json": pa.string(),
+    }[kind]
+
+def column_kinds(collection_name: str, all_fields: list) -> dict:
+    columns = PARQUET_COLUMNS.get(collection_name, {})
+    return {field: columns.get(field, "json") for field in all_fields}
+
+def id_to_struct(value) -> dict:
+    """
+    Les Binary sont stockés sur leurs octets avec leur sous-type, les ObjectId sur leurs 12 octets
+    et les id en texte (ex: "1" dans les CSV d'exemple) en UTF-8, le type est gardé à côté
+    """
+    if isinstance(value, bytes):
+        # pymongo retourne les Binary de sous-type 0 en bytes
+        return {"type": getattr(value, "subtype", 0), "value": bytes(value)}
+    if isinstance(value, ObjectId):
+        return {"type": ID_OBJECTID, "value": value.binary}
+    if isinstance(value, str):
+        return {"type": ID_STRING, "value": value.encode('utf-8')}
+    raise NotConvertible(value)
+
+def id_from_struct(id_kind: int, value: bytes):
+    # Inverse de id_to_struct
+    if id_kind is None:
+        return None
+    if id_kind == ID_OBJECTID:
+        return ObjectId(value)
+    if id_kind == ID_STRING:
+        return value.decode('utf-8')
+    return Binary(value, id_kind) if id_kind else value
+
+def to_timestamp(value):
+    # Seules les dates MongoDB (naïves, à la milliseconde) vont dans la colonne, pas les dates en texte
+    if not isinstance(value, datetime) or value.tzinfo is not None or value.microsecond % 1000:
+        raise NotConvertible(value)
+    return value
+
+def to_list(value, convert) -> list:
+    if not isinstance(value, list):
+        raise NotConvertible(value)
+    return [convert(element) for element in value]
+
+def to_string(value) -> str:
+    if not isinstance(value, str):
+        raise NotConvertible(value)
+    return value
+
+def to_comment(comment) -> dict:
+    if not isinstance(comment, dict) or set(comment) != {"user_id", "comment"}:
+        raise NotConvertible(comment)
+    return {"user_id": id_to_struct(comment["user_id"]), "comment": to_string(comment["comment"])}
+
+# Conversion d'une valeur MongoDB vers la valeur Python attendue par pyarrow pour chaque type de colonne,
+# NotConvertible si la valeur doit aller dans la colonne de repli
+TO_ARROW = {
+    "id": id_to_struct,
+    "ids": lambda value: to_list(value, id_to_struct),
+    "string": to_string,
+    "strings": lambda value: to_list(value, to_string),
+    "timestamp": to_timestamp,
+    "comments": lambda value: to_list(value, to_comment),
+    "json": lambda value: json_util.dumps(value, json_options=PARQUET_JSON_OPTIONS),
+}
+
+def binary_ids_array(values: list):
+    """
+    Colonne "id" d'une liste de Binary (ou None), construite par pyarrow à partir des octets des Binary
+    sans conversion Python id par id
+
+    Lève:
+        NotConvertible: Si une valeur n'est pas un Binary
+    """
+    if not set(map(type, values)) <= {Binary, type(None)}:
+        raise NotConvertible(values)
+    subtypes = list(map(getattr, values, repeat("subtype"), repeat(0)))
+    return pa.StructArray.from_arrays([pa.array(subtypes, pa.int16()), pa.array(values, pa.binary())],
+                                      fields=list(id_type()), mask=pa.array(list(map(operator.is_, values, repeat(None)))))
+
+def binary_id_lists_array(values: list):
+    """
+    Colonne "ids" de listes de Binary (ou None): les Binary de toutes les listes sont mis à plat dans une seule
+    colonne "id" et la liste de chaque document est donnée par les offsets
+    """
+    if not set(map(type, values)) <= {list, type(None)}:
+        raise NotConvertible(values)
+    lists = [value or [] for value in values]
+    offsets = pa.array(list(accumulate(map(len, lists), initial=0)), pa.int32())
+    return pa.ListArray.from_arrays(offsets, binary_ids_array(list(chain.from_iterable(lists))), type=arrow_type("ids"),
+                                    mask=pa.array(list(map(operator.is_, values, repeat(None)))))
+
+# Construction directe des colonnes dans le cas courant (que des Binary)
+FAST_TO_ARROW = {
+    "id": binary_ids_array,
+    "ids": binary_id_lists_array,
+}
+
+def ids_from_array(array) -> list:
+    """
+    Id d'une colonne "id" lue dans le fichier Parquet
+    """
+    types, values = (child.to_pylist() for child in array.flatten())
+    id_kinds = set(types)
+    if len(id_kinds) == 1 and next(iter(id_kinds)) not in (None, 0, ID_OBJECTID, ID_STRING):
+        return list(map(Binary, values, types))
+    return list(map(id_from_struct, types, values))
+
+def id_lists_from_array(array) -> list:
+    """
+    Listes d'id d'une colonne "ids": toutes les listes sont converties en une fois puis redécoupées
+    """
+    ids = ids_from_array(array.flatten())
+    lists = []
+    position = 0
+    for length in array.value_lengths().to_pylist():
+        if length is None:
+            lists.append(None)
+        else:
+            lists.append(ids[position:position + length])
+            position += length
+    return lists
+
+# Conversion inverse, d'une colonne lue dans le fichier Parquet vers les valeurs à enregistrer dans MongoDB
+FROM_ARROW = {
+    "id": ids_from_array,
+    "ids": id_lists_from_array,
+    "string": lambda array: array.to_pylist(),
+    "strings": lambda array: array.to_pylist(),
+    "timestamp": lambda array: array.to_pylist(),
+    "comments": lambda array: [None if value is None else
+                               [{"user_id": id_from_struct(comment["user_id"]["type"], comment["user_id"]["value"]),
+                                 "comment": comment["comment"]} for comment in value]
+                               for value in array.to_pylist()],
+    "json": lambda array: [None if value is None else json_util.loads(value, json_options=PARQUET_JSON_OPTIONS)
+                           for value in array.to_pylist()],
+}
+
+def column_arrays(field: str, kind: str, documents: list, arrow_field_type) -> tuple:
+    """
+    Colonne typée et colonne de repli d'un champ pour un paquet de documents
+    """
+    values = [document.get(field) for document in documents]
+    fallback = [None] * len(values)
+    typed = None
+    if kind in FAST_TO_ARROW:
+        try:
+            typed = FAST_TO_ARROW[kind](values)
+        except NotConvertible:
+            pass
+    if typed is None:
+        convert = TO_ARROW[kind]
+        typed_values = []
+        for position, value in enumerate(values):
+            try:
+                typed_values.append(None if value is None else convert(value))
+            except NotConvertible:
+                typed_values.append(None)
+                fallback[position] = json_util.dumps(value, json_options=PARQUET_JSON_OPTIONS)
+        typed = pa.array(typed_values, type=arrow_field_type)
+    # Un champ présent à null n'est pas un champ absent
+    for position, value in enumerate(values):
+        if value is None and field in documents[position]:
+            fallback[position] = "null"
+    return typed, pa.array(fallback, pa.string())
+
+def documents_to_table(documents: list, kinds: dict, schema):
+    columns = {}
+    for field, kind in kinds.items():
+        columns[field], columns[field + FALLBACK_SUFFIX] = column_arrays(field, kind, documents,
+                                                                         schema.field(field).type)
+    return pa.Table.from_pydict(columns, schema=schema)
+
+def export_data_to_parquet(filename: str, collection_name: str, query: dict = None,
+                           row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    """
+    Exportation des documents de la collection collection_name dans un fichier Parquet (compressé en zstd),
+    avec une colonne typée par champ (listes et structures comprises, voir PARQUET_COLUMNS)
+    et sa colonne de repli en JSON étendu (voir FALLBACK_SUFFIX). Le type de chaque colonne est
+    enregistré dans les métadonnées du fichier
+
+    Args:
+        filename (str): Le nom du fichier Parquet
+        collection_name (str): Le nom de la collection
+        query (dict): Filtre MongoDB des documents à exporter (tous par défaut)
+        row_group_size (int): Le nombre de documents gardés en mémoire et écrits par row group
+
+    Retourne:
+        int: Le nombre de documents exportés
+    """
+    require_pyarrow()
+    collection = db[collection_name]
+    all_fields = collection_fields(collection, query)
+    if not all_fields:
+        print(f"La collection {collection_name} ne contient aucun document")
+        return 0
+
+    kinds = column_kinds(collection_name, all_fields)
+    schema = pa.schema([column for field, kind in kinds.items()
+                        for column in ((field, arrow_type(kind)), (field + FALLBACK_SUFFIX, pa.string()))],
+                       metadata={"kinds": json.dumps(kinds)})
+    documents = collection.find(query or {}).batch_size(EXPORT_BATCH_SIZE)
+    count = 0
+    with pq.ParquetWriter(filename, schema, compression="zstd") as writer:
+        while True:
+            batch = list(islice(documents, row_group_size))
+            if not batch:
+                break
+            writer.write_table(documents_to_table(batch, kinds, schema))
+            count += len(batch)
+
+    print(f"Exportation Parquet: terminé ({count} documents)")
+    return count
+
+def read_parquet_documents(filename: str, collection_name: str, columns: list = None,
+                           batch_size: int = IMPORT_BATCH_SIZE):
+    """
+    Lit un fichier Parquet exporté par export_data_to_parquet et retourne les documents par paquets de batch_size.
+    Seules les colonnes demandées (et leurs colonnes de repli) sont lues et décompressées (toutes par défaut)
+
+    Retourne:
+        Générateur de listes de documents MongoDB
+    """
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(filename)
+    schema = parquet_file.schema_arrow
+    file_kinds = json.loads(schema.metadata[b"kinds"]) if schema.metadata and b"kinds" in schema.metadata else {}
+    fields = columns or [name for name in schema.names if not name.endswith(FALLBACK_SUFFIX)]
+    kinds = {field: file_kinds.get(field) or column_kinds(collection_name, [field])[field] for field in fields}
+    fallbacks = [field + FALLBACK_SUFFIX for field in kinds if field + FALLBACK_SUFFIX in schema.names]
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(kinds) + fallbacks):
+        documents = [{} for _ in range(record_batch.num_rows)]
+        for field, kind in kinds.items():
+            values = FROM_ARROW[kind](record_batch.column(field))
+            fallback_values = record_batch.column(field + FALLBACK_SUFFIX).to_pylist() \
+                if field + FALLBACK_SUFFIX in fallbacks else repeat(None)
+            for document, value, fallback in zip(documents, values, fallback_values):
+                # Les valeurs nulles sans valeur de repli sont les champs absents du document exporté
+                if value is not None:
+                    document[field] = value
+                elif fallback is not None:
+                    document[field] = json_util.loads(fallback, json_options=PARQUET_JSON_OPTIONS)
+        yield documents
+
+def import_data_from_parquet(filename: str, collection_name: str, columns: list = None,
+                             batch_size: int = IMPORT_BATCH_SIZE) -> None:
+    """
+    Importation des documents d'un fichier Parquet dans la collection collection_name.
+    Les documents sont mis à jour (ou créés) par _id, on peut donc restaurer seulement quelques colonnes
+    sans toucher aux autres champs des documents existants
+
+    Args:
+        filename (str): Le nom du fichier Parquet
+        collection_name (str): Le nom de la collection
+        columns (list): Les colonnes à importer, _id est toujours lu (toutes par défaut)
+        batch_size (int): Le nombre de documents écrits par requête
+    """
+    if columns is not None and "_id" not in columns:
+        columns = ["_id"] + list(columns)
+
+    start = time.perf_counter()
+    count = 0
+    for documents in read_parquet_documents(filename, collection_name, columns, batch_size):
+        db[collection_name].bulk_write([UpdateOne({"_id": document.pop("_id")}, {"$set": document}, upsert=True)
+                                        for document in documents], ordered=False)
+        count += len(documents)
+
+    duration = time.perf_counter() - start
+    print(f"Importation Parquet: terminé ({count} documents, {count / duration if duration else 0:.0f} documents/s)")
+
+# Exemple d'utilisation pour exporter et réimporter une collection
+"""export_data_to_parquet('csv data/exports/user_export.parquet', 'users')
+import_data_from_parquet('csv data/exports/user_export.parquet', 'users', columns=['interests'])"""
+
+
 # Sauvegarde de la bdd MongoDB
-def daily_backup():
+# Liste des collections à sauvegarder
+BACKUP_COLLECTIONS = ["users", "group", "posts", "privates_messages", "pages"]
+BACKUP_DIR = "backups"  # Dossier où sont créées les sauvegardes, un sous-dossier par jour
+BACKUP_WORKERS = 4  # Nombre de fichiers exportés en même temps
+# Au-delà de ce nombre de documents, une collection est découpée en plusieurs fichiers par plage d'_id
+BACKUP_CHUNK_DOCUMENTS = 1_000_000
+# Compression des fichiers de sauvegarde: "gzip" ou "zstd" (nécessite le module zstandard)
+BACKUP_COMPRESSION = "gzip"
+FULL_BACKUP_EVERY_DAYS = 7  # Nombre de jours entre deux sauvegardes complètes en mode "auto"
+# Champs de date utilisés pour trouver les documents créés ou modifiés depuis la sauvegarde précédente,
+# ils sont indexés par daily_backup. Les documents dont l'_id est un ObjectId sont aussi trouvés par la date
+# de création contenue dans leur _id
+BACKUP_WATERMARK_FIELDS = ["updatedAt", "createdAt"]
+# Marge (en secondes) retirée au high-water mark pour ne pas rater de documents à cause du décalage des horloges
+BACKUP_WATERMARK_OVERLAP = 300
+# Format des cellules des sauvegardes: chaque valeur est écrite en JSON étendu MongoDB canonique, les dates,
+# Binary, ObjectId, Int64... gardent donc leur type à la restauration. Une cellule vide est un champ absent
+BACKUP_CELL_FORMAT = "extended-json"
+BACKUP_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+class HashingWriter:
     """
-    Fonction de sauvegarde de la bdd : Exporte toutes les collections vers des fichiers CSV
+    Fichier binaire qui calcule le sha256 et la taille de ce qui y est écrit, pour le manifeste
     """
-    # Liste des collections à sauvegarder
-    collections = ["users", "group", "posts", "privates_messages", "pages"]
-    
-    # Date actuelle pour nommer les fichiers
-    current_date = datetime.now().strftime("%d-%m-%Y")
-    
-    for collection in collections:
-        # Nom du fichier avec la date
-        filename = f"{collection.lower()}_export_{current_date}.csv"
-        export_data_to_csv(filename, collection)
-    
-    print("Sauvegarde terminée.")
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+
+def compressed_writer(file, compression: str = BACKUP_COMPRESSION):
+    """
+    Retourne un flux binaire qui compresse ce qui y est écrit avant de l'écrire dans file
+    """
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("Le module zstandard est nécessaire pour la compression zstd (pip install zstandard)")
+        return zstandard.ZstdCompressor().stream_writer(file)
+    return gzip.GzipFile(fileobj=file, mode="wb")
+
+def bson_type(value) -> str:
+    """
+    Alias $type MongoDB d'un _id, les types numériques sont comparés entre eux par $lt/$gte
+    """
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float, Decimal128)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, bytes):
+        return "binData"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    return "object"
+
+def id_ranges(collection, chunk_documents: int = BACKUP_CHUNK_DOCUMENTS) -> list:
+    """
+    Découpe la collection en plages d'_id d'environ chunk_documents documents pour les exporter en parallèle.
+    Les bornes sont trouvées en parcourant l'index sur _id.
+    MongoDB ne compare avec $lt/$gte que des valeurs du même type, or une collection peut mélanger
+    les _id Binary de l'application et les ObjectId de import_data_from_csv: les plages sont donc faites
+    type par type, et une dernière plage contient les _id des types qui n'ont aucune borne
+
+    Retourne:
+        list: Les filtres MongoDB de chaque plage ({} si la collection n'est pas découpée)
+    """
+    count = collection.estimated_document_count()
+    bounds = []
+    for position in range(chunk_documents, count, chunk_documents):
+        document = next(iter(collection.find({}, {"_id": 1}).sort("_id", 1).skip(position).limit(1)), None)
+        if document is not None:
+            bounds.append(document["_id"])
+    if not bounds:
+        return [{}]
+
+    # Les bornes sont triées, celles d'un même type se suivent
+    bounds_by_type = {}
+    for bound in bounds:
+        bounds_by_type.setdefault(bson_type(bound), []).append(bound)
+    ranges = []
+    for type_bounds in bounds_by_type.values():
+        ranges.append({"_id": {"$lt": type_bounds[0]}})
+        ranges += [{"_id": {"$gte": low, "$lt": high}} for low, high in zip(type_bounds, type_bounds[1:])]
+        ranges.append({"_id": {"$gte": type_bounds[-1]}})
+    ranges.append({"$nor": [{"_id": {"$type": type_name}} for type_name in bounds_by_type]})
+    return ranges
+
+def write_backup_documents(csvfile, documents, all_fields: list) -> int:
+    """
+    Écrit les en-têtes puis chaque document dans un CSV de sauvegarde, une cellule par champ
+    au format BACKUP_CELL_FORMAT
+
+    Retourne:
+        int: Le nombre de documents écrits
+    """
+    writer = csv.writer(csvfile)
+    writer.writerow(all_fields)
+    count = 0
+    for doc in documents:
+        writer.writerow([json_util.dumps(doc[field], json_options=BACKUP_JSON_OPTIONS) if field in doc else ''
+                         for field in all_fields])
+        count += 1
+    return count
+
+def export_compressed_csv(path: str, collection_name: str, query: dict, all_fields: list,
+                          compression: str = BACKUP_COMPRESSION) -> dict:
+    """
+    Exporte les documents de la collection qui correspondent à query dans un fichier CSV compressé
+
+    Retourne:
+        dict: Les informations du fichier pour le manifeste (nom, nombre de lignes, taille, sha256)
+    """
+    with open(path, 'wb') as file:
+        hashing_file = HashingWriter(file)
+        with io.TextIOWrapper(compressed_writer(hashing_file, compression), encoding='utf-8', newline='') as csvfile:
+            rows = write_backup_documents(csvfile, db[collection_name].find(query).batch_size(EXPORT_BATCH_SIZE),
+                                          all_fields)
+    return {"file": os.path.basename(path), "rows": rows, "bytes": hashing_file.size,
+            "sha256": hashing_file.sha256.hexdigest()}
+
+def load_backup_state() -> dict:
+    path = os.path.join(BACKUP_DIR, "state.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+def save_backup_state(state: dict) -> None:
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with open(os.path.join(BACKUP_DIR, "state.json"), 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file, indent=2)
+
+def daily_backup(mode: str = "auto"):
+    """
+    Fonction de sauvegarde de la bdd : Exporte toutes les collections vers des fichiers CSV compressés
+
+    Args:
+        mode (str): "full" (tous les documents), "incremental" (seulement les documents créés ou modifiés
+                    depuis la sauvegarde précédente) ou "auto" (full tous les FULL_BACKUP_EVERY_DAYS jours,
+                    incremental sinon)
+
+    Fonctionnement:
+        - Découpe les grosses collections en plages d'_id
+        - Exporte chaque plage en parallèle (BACKUP_WORKERS threads) dans son propre fichier compressé
+        - Compare le nombre de lignes écrites pour chaque collection au nombre de documents compté avant l'export,
+          les deux sont dans le manifeste. Sur une base en service, des documents ajoutés ou supprimés pendant
+          l'export suffisent à les rendre différents: on affiche un avertissement sans annuler la sauvegarde
+        - Écrit un manifeste manifest.json avec le type de sauvegarde, la sauvegarde précédente, le high-water mark
+          et le nombre de lignes, la taille et le sha256 de chaque fichier
+        - Une sauvegarde incrémentale ne lit que les documents dont un champ de BACKUP_WATERMARK_FIELDS
+          (une date, pas un texte) ou l'_id ObjectId est postérieur à la sauvegarde précédente, avec les index
+          sur ces champs. Elle ne voit donc pas:
+            - les documents supprimés, qui disparaissent à la sauvegarde complète suivante
+            - les modifications des documents sans updatedAt, ce qui est le cas des documents de l'application
+              (voir csv data/exports): elles ne sont sauvegardées qu'à la sauvegarde complète suivante
+            - les documents avec un _id Binary et un createdAt en texte (import_data_from_csv, generate_data)
+          Tant que l'application n'écrit pas updatedAt, garder FULL_BACKUP_EVERY_DAYS petit
+    """
+    start = time.perf_counter()
+    # Le high-water mark est l'heure de début de la sauvegarde: les documents modifiés pendant
+    # l'export seront aussi dans la sauvegarde suivante
+    started_at = datetime.now(timezone.utc)
+    state = load_backup_state()
+    if mode == "auto":
+        last_full = datetime.fromisoformat(state["last_full_at"]) if "last_full_at" in state else None
+        mode = "incremental" if last_full and started_at - last_full < timedelta(days=FULL_BACKUP_EVERY_DAYS) else "full"
+    if mode == "incremental" and "last_backup" not in state:
+        mode = "full"
+
+    # Date actuelle (à la microseconde) pour nommer le dossier de la sauvegarde. Un dossier existant n'est jamais
+    # réutilisé: ses fichiers seraient écrasés et la sauvegarde deviendrait sa propre sauvegarde précédente
+    backup_name = started_at.astimezone().strftime("%d-%m-%Y_%H-%M-%S-%f")
+    backup_dir = os.path.join(BACKUP_DIR, backup_name)
+    os.makedirs(backup_dir)
+    extension = "zst" if BACKUP_COMPRESSION == "zstd" else "gz"
+
+    manifest = {"name": backup_name, "type": mode, "compression": BACKUP_COMPRESSION,
+                "cell_format": BACKUP_CELL_FORMAT, "watermark": started_at.isoformat(), "collections": {}}
+    if mode == "incremental":
+        manifest["previous"] = state["last_backup"]
+        since = datetime.fromisoformat(state["watermark"]) - timedelta(seconds=BACKUP_WATERMARK_OVERLAP)
+        manifest["since"] = since.isoformat()
+        changed = {"$or": [{field: {"$gte": since}} for field in BACKUP_WATERMARK_FIELDS] +
+                          [{"_id": {"$gte": ObjectId.from_datetime(since)}}]}
+
+    expected_rows = {}
+    with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as executor:
+        futures = {}
+        for collection in BACKUP_COLLECTIONS:
+            # Sans ces index, chaque sauvegarde incrémentale relirait toute la collection
+            for field in BACKUP_WATERMARK_FIELDS:
+                db[collection].create_index(field)
+            all_fields = collection_fields(db[collection], None if mode == "full" else changed)
+            manifest["collections"][collection] = {"fields": all_fields, "documents": 0, "rows": 0, "files": []}
+            if not all_fields:
+                continue
+            expected_rows[collection] = db[collection].count_documents({} if mode == "full" else changed)
+            manifest["collections"][collection]["documents"] = expected_rows[collection]
+            queries = id_ranges(db[collection]) if mode == "full" else [changed]
+            for part, query in enumerate(queries):
+                path = os.path.join(backup_dir, f"{collection}.part{part}.csv.{extension}")
+                futures[executor.submit(export_compressed_csv, path, collection, query, all_fields)] = collection
+
+        for future, collection in futures.items():
+            file_info = future.result()
+            manifest["collections"][collection]["files"].append(file_info)
+            manifest["collections"][collection]["rows"] += file_info["rows"]
+
+    different = {collection: (manifest["collections"][collection]["rows"], rows)
+                 for collection, rows in expected_rows.items() if manifest["collections"][collection]["rows"] != rows}
+    if different:
+        details = ", ".join(f"{collection}: {written} lignes écrites pour {rows} documents comptés"
+                            for collection, (written, rows) in different.items())
+        print(f"Attention: sauvegarde {backup_name}, {details} (documents ajoutés ou supprimés pendant l'export ?)")
+
+    manifest["duration"] = time.perf_counter() - start
+    manifest["bytes"] = sum(file_info["bytes"] for collection in manifest["collections"].values()
+                            for file_info in collection["files"])
+    with open(os.path.join(backup_dir, "manifest.json"), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    state["last_backup"] = backup_name
+    state["watermark"] = started_at.isoformat()
+    if mode == "full":
+        state["last_full_at"] = started_at.isoformat()
+    save_backup_state(state)
+
+    print(f"Sauvegarde {mode} terminée en {manifest['duration']:.1f}s ({manifest['bytes'] / 1024 / 1024:.1f} Mo).")
+
+def load_manifest(backup_name: str) -> dict:
+    with open(os.path.join(BACKUP_DIR, backup_name, "manifest.json"), 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+def backup_chain(backup_name: str) -> list:
+    """
+    Retourne les manifestes à rejouer pour restaurer backup_name: la sauvegarde complète
+    puis les sauvegardes incrémentales dans l'ordre
+    """
+    chain = [load_manifest(backup_name)]
+    while chain[0]["type"] == "incremental":
+        if chain[0]["previous"] in (manifest["name"] for manifest in chain):
+            raise ValueError(f"La chaîne de sauvegardes de {backup_name} boucle sur {chain[0]['previous']}")
+        chain.insert(0, load_manifest(chain[0]["previous"]))
+    return chain
+
+def open_compressed_csv(path: str, compression: str):
+    file = open(path, 'rb')
+    if compression == "zstd":
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(file, closefd=True),
+                                encoding='utf-8', newline='')
+    return io.TextIOWrapper(gzip.GzipFile(fileobj=file, mode="rb"), encoding='utf-8', newline='')
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def decode_backup_row(row: dict) -> dict:
+    """
+    Document MongoDB d'une ligne écrite par write_backup_documents, les cellules vides sont des champs absents
+    """
+    return {field: json_util.loads(value, json_options=BACKUP_JSON_OPTIONS) for field, value in row.items() if value}
+
+def decode_cell(field: str, value: str):
+    """
+    Convertit une cellule d'un CSV exporté par export_data_to_csv (ou d'une sauvegarde écrite avant
+    BACKUP_CELL_FORMAT) vers sa valeur MongoDB: les _id hexadécimaux redeviennent des Binary (UUID)
+    et les listes et dictionnaires écrits par l'export sont relus. Les autres types (dates, ObjectId...) sont perdus
+    """
+    if field == "_id" and len(value) == 32:
+        try:
+            return Binary(bytes.fromhex(value), 3)
+        except ValueError:
+            return value
+    if value[:1] in ("[", "{"):
+        try:
+            return parse_structured(value)
+        except ValueError:
+            return value
+    return value
+
+def restore_backup(backup_name: str, batch_size: int = IMPORT_BATCH_SIZE) -> None:
+    """
+    Restaure une sauvegarde en rejouant sa sauvegarde complète puis ses sauvegardes incrémentales.
+    Chargement en masse: chaque document remplace celui qui a le même _id (ou est créé), par paquets de batch_size,
+    les documents des sauvegardes incrémentales écrasent donc les anciennes versions
+
+    Args:
+        backup_name (str): Le nom du dossier de la sauvegarde dans BACKUP_DIR
+        batch_size (int): Le nombre de documents écrits par requête
+    """
+    for manifest in backup_chain(backup_name):
+        backup_dir = os.path.join(BACKUP_DIR, manifest["name"])
+        for collection, collection_info in manifest["collections"].items():
+            for file_info in collection_info["files"]:
+                path = os.path.join(backup_dir, file_info["file"])
+                if file_sha256(path) != file_info["sha256"]:
+                    raise ValueError(f"Le fichier {path} est corrompu (sha256 différent du manifeste)")
+
+                # Les sauvegardes sans cell_format ont été écrites avec write_csv_documents
+                decode = decode_backup_row if manifest.get("cell_format") == BACKUP_CELL_FORMAT else \
+                    lambda row: {field: decode_cell(field, value) for field, value in row.items()}
+                with open_compressed_csv(path, manifest["compression"]) as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    while True:
+                        rows = list(islice(reader, batch_size))
+                        if not rows:
+                            break
+                        documents = [decode(row) for row in rows]
+                        db[collection].bulk_write([ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                                                   for document in documents], ordered=False)
+            print(f"Restauration {manifest['name']} {collection}: {collection_info['rows']} documents")
+
+    print("Restauration terminée.")
 
 """# Planifier la sauvegarde tous les jours à 00h00
 schedule.every().day.at("00:00").do(daily_backup)
@@ -219,4 +980,13 @@ schedule.every().day.at("00:00").do(daily_backup)
 while True:
     print("En attente de la prochaine sauvegarde...")
     schedule.run_pending()
-    time.sleep(120)"""
\ No newline at end of file
+    time.sleep(120)"""
+
+# Sauvegarde ou restauration à la main:
+#   python backup-csv.py backup [auto|full|incremental]
+#   python backup-csv.py restore <nom du dossier de la sauvegarde>
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "restore":
+        restore_backup(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == "backup":
+        daily_backup(sys.argv[2] if len(sys.argv) > 2 else "auto")
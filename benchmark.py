@@ -0,0 +1,541 @@
+"""
+Benchmarks des différents traitements, à lancer contre des instances locales
+(ex: un Neo4j lancé avec docker run -p 7687:7687 neo4j) et jamais contre la production
+
+Utilisation:
+    python benchmark.py merge [nombre de noeuds]
+    python benchmark.py recommendations [nombre d'utilisateurs]
+    python benchmark.py traversal [nombre d'utilisateurs du graphe synthétique]
+    python benchmark.py export [taille de la collection en Mo]
+    python benchmark.py formats
+    python benchmark.py comments [nombre de lignes]
+    python benchmark.py projection [nombre d'utilisateurs] [nombre de threads]
+    python benchmark.py suite [nombre d'utilisateurs générés] [taille de l'échantillon de recommandations]
+"""
+import csv
+import importlib
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from py2neo import Node
+
+import generate_data
+import middleware_save
+import recommandations
+import recommandations_graph
+
+backup_csv = importlib.import_module("backup-csv")
+
+# Label utilisé pour les noeuds de test, supprimés à la fin de chaque benchmark
+BENCH_LABEL = "Benchmark"
+
+# Base MongoDB remplie par bench_suite, supprimée à la fin
+SUITE_DATABASE = "benchmark_suite"
+# Fichier JSON où bench_suite ajoute les résultats de chaque exécution, pour les comparer d'une version à l'autre
+RESULTS_FILE = "benchmark_results.json"
+
+def clean_benchmark_nodes():
+    middleware_save.neo4j_graph.run(f"MATCH (n:{BENCH_LABEL}) DETACH DELETE n")
+
+def bench_merge(count: int = 10000) -> dict:
+    """
+    Compare le débit (noeuds/s) d'un merge par noeud et d'un merge par paquets UNWIND
+
+    Args:
+        count (int): Le nombre de noeuds à créer pour chaque méthode
+
+    Retourne:
+        dict: Le débit de chaque méthode
+    """
+    graph = middleware_save.neo4j_graph
+    graph.run(f"CREATE CONSTRAINT benchmark_id IF NOT EXISTS FOR (n:{BENCH_LABEL}) REQUIRE n.id IS UNIQUE")
+    rows = [{"id": str(i), "name": f"node {i}"} for i in range(count)]
+    results = {}
+
+    clean_benchmark_nodes()
+    start = time.perf_counter()
+    for row in rows:
+        graph.merge(Node(BENCH_LABEL, **row), BENCH_LABEL, "id")
+    results["per_row"] = count / (time.perf_counter() - start)
+
+    clean_benchmark_nodes()
+    start = time.perf_counter()
+    middleware_save.merge_nodes(BENCH_LABEL, rows)
+    results["batched"] = count / (time.perf_counter() - start)
+
+    clean_benchmark_nodes()
+    for method, throughput in results.items():
+        print(f"merge {method}: {throughput:.0f} noeuds/s")
+    return results
+
+def percentile(values: list, rank: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * rank / 100))]
+
+def latency_report(name: str, latencies: list) -> dict:
+    report = {"p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000}
+    print(f"{name}: p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms")
+    return report
+
+def sample_user_ids(count: int) -> list:
+    return [record["id"] for record in recommandations.graph.run(
+        "MATCH (u:Users) RETURN u.id AS id LIMIT $count", count=count)]
+
+def bench_recommendations(count: int = 200) -> dict:
+    """
+    Compare la latence des quatre requêtes séquentielles et de la requête combinée, sans le cache
+
+    Args:
+        count (int): Le nombre d'utilisateurs pour lesquels on calcule les recommandations
+    """
+    user_ids = sample_user_ids(count)
+    sequential = []
+    combined = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recommandations.get_friend_recommendations_by_common_friends(user_id)
+        recommandations.get_friend_recommendations_by_common_interests(user_id)
+        recommandations.get_group_recommendations(user_id)
+        recommandations.get_page_recommendations(user_id)
+        sequential.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        recommandations.get_all_recommendations(user_id)
+        combined.append(time.perf_counter() - start)
+
+    return {"sequential": latency_report("recommandations séquentielles", sequential),
+            "combined": latency_report("recommandations combinées", combined)}
+
+def generate_power_law_graph(user_count: int, edges_per_user: int = 5, group_count: int = 200) -> list:
+    """
+    Crée dans Neo4j un graphe d'amitié synthétique dont les degrés suivent une loi de puissance
+    (attachement préférentiel: un nouvel utilisateur choisit ses amis proportionnellement à leur degré).
+    Les noeuds ont des id préfixés par "bench-" pour être supprimés par clean_power_law_graph()
+
+    Retourne:
+        list: Les id des utilisateurs, triés par degré décroissant
+    """
+    user_ids = [f"bench-user-{i}" for i in range(user_count)]
+    group_ids = [f"bench-group-{i}" for i in range(group_count)]
+    # Chaque utilisateur apparaît dans endpoints autant de fois que son degré
+    endpoints = list(user_ids[:edges_per_user])
+    friendships = set()
+    for user_id in user_ids[edges_per_user:]:
+        for friend_id in {random.choice(endpoints) for _ in range(edges_per_user)}:
+            friendships.add((user_id, friend_id))
+            friendships.add((friend_id, user_id))
+            endpoints += [user_id, friend_id]
+    # Les groupes les plus populaires ont beaucoup plus de membres (loi de Zipf)
+    group_weights = [1 / (rank + 1) for rank in range(group_count)]
+    memberships = {(user_id, group_id) for user_id in user_ids
+                   for group_id in random.choices(group_ids, weights=group_weights, k=3)}
+
+    middleware_save.create_constraints()
+    middleware_save.merge_nodes("Users", [{"id": user_id} for user_id in user_ids])
+    middleware_save.merge_nodes("Group", [{"id": group_id, "name": group_id} for group_id in group_ids])
+    middleware_save.merge_relationships("FRIENDS", friendships)
+    middleware_save.merge_relationships("MEMBER_OF", memberships)
+
+    degrees = {}
+    for user_id, _ in friendships:
+        degrees[user_id] = degrees.get(user_id, 0) + 1
+    return sorted(user_ids, key=lambda user_id: degrees.get(user_id, 0), reverse=True)
+
+def clean_power_law_graph():
+    middleware_save.neo4j_graph.run("""
+        MATCH (n) WHERE (n:Users OR n:Group) AND n.id STARTS WITH 'bench-'
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+    """)
+
+def bench_traversal(user_count: int = 100_000, sample_size: int = 50) -> dict:
+    """
+    Compare la latence et le rappel (part des recommandations exactes retrouvées) des parcours exact
+    et bounded sur un graphe synthétique, pour les utilisateurs avec le plus d'amis et pour des utilisateurs au hasard
+    """
+    print(f"Génération d'un graphe de {user_count} utilisateurs...")
+    user_ids = generate_power_law_graph(user_count)
+    samples = {"supernodes": user_ids[:sample_size], "random": random.sample(user_ids, sample_size)}
+    functions = {
+        "friends": (recommandations.get_friend_recommendations_by_common_friends,
+                    recommandations.get_friend_recommendations_by_common_friends_bounded, "user_id"),
+        "groups": (recommandations.get_group_recommendations,
+                   recommandations.get_group_recommendations_bounded, "group_id"),
+    }
+    results = {}
+    try:
+        for sample_name, sample in samples.items():
+            for name, (exact_function, bounded_function, key) in functions.items():
+                exact_latencies, bounded_latencies, recalls = [], [], []
+                for user_id in sample:
+                    start = time.perf_counter()
+                    exact = {row[key] for row in exact_function(user_id)}
+                    exact_latencies.append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    try:
+                        bounded = {row[key] for row in bounded_function(user_id)}
+                    except recommandations.QueryBudgetExceeded:
+                        # Une requête arrêtée par QUERY_TIME_BUDGET compte comme une réponse vide
+                        bounded = set()
+                    bounded_latencies.append(time.perf_counter() - start)
+                    if exact:
+                        recalls.append(len(exact & bounded) / len(exact))
+
+                label = f"{name} ({sample_name})"
+                results[label] = {
+                    "exact": latency_report(f"{label} exact", exact_latencies),
+                    "bounded": latency_report(f"{label} bounded", bounded_latencies),
+                    "recall": sum(recalls) / len(recalls) if recalls else None,
+                }
+                if recalls:
+                    print(f"{label} rappel bounded: {results[label]['recall']:.2%}")
+    finally:
+        clean_power_law_graph()
+    return results
+
+def generate_posts_collection(collection_name: str, size_mb: int) -> int:
+    """
+    Remplit une collection MongoDB de test avec des posts d'environ 1 Ko jusqu'à size_mb Mo
+
+    Retourne:
+        int: Le nombre de documents créés
+    """
+    collection = backup_csv.db[collection_name]
+    collection.drop()
+    count = size_mb * 1024
+    for start in range(0, count, 10_000):
+        collection.insert_many([
+            {"userId": f"user-{i % 10_000}", "content": "x" * 900, "image": f"image{i}.png",
+             "likes": [f"user-{(i + j) % 10_000}" for j in range(i % 8)], "comments": [], "createdAt": time.time()}
+            for i in range(start, min(count, start + 10_000))
+        ], ordered=False)
+    return count
+
+def bench_export(size_mb: int = 2048) -> dict:
+    """
+    Mesure le débit et la mémoire maximale de export_data_to_csv sur une collection générée de size_mb Mo.
+    La mémoire allouée par Python (tracemalloc) doit rester la même quelle que soit la taille de la collection
+    """
+    collection_name = "benchmark_export"
+    print(f"Génération d'une collection de {size_mb} Mo...")
+    count = generate_posts_collection(collection_name, size_mb)
+    filename = os.path.join(tempfile.mkdtemp(), "export.csv")
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        backup_csv.export_data_to_csv(filename, collection_name)
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results = {
+            "documents_per_second": count / duration,
+            "mb_per_second": os.path.getsize(filename) / 1024 / 1024 / duration,
+            "peak_python_memory_mb": peak / 1024 / 1024,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    finally:
+        backup_csv.db[collection_name].drop()
+        if os.path.exists(filename):
+            os.remove(filename)
+    print(f"export: {results['documents_per_second']:.0f} documents/s, {results['mb_per_second']:.1f} Mo/s, "
+          f"mémoire Python max {results['peak_python_memory_mb']:.1f} Mo, RSS max {results['peak_rss_mb']:.0f} Mo")
+    return results
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def read_csv_documents(filename: str) -> int:
+    with open(filename, 'r', encoding='utf-8', newline='') as csvfile:
+        return sum(1 for row in csv.DictReader(csvfile)
+                   if {field: backup_csv.decode_cell(field, value) for field, value in row.items()})
+
+def read_parquet_documents(filename: str, collection_name: str, columns: list = None) -> int:
+    return sum(len(documents) for documents in backup_csv.read_parquet_documents(filename, collection_name, columns))
+
+def bench_formats() -> dict:
+    """
+    Compare pour chaque collection de BACKUP_COLLECTIONS la taille, la durée d'export et la durée de relecture
+    (décodage des documents, sans écriture dans MongoDB) des formats CSV et Parquet,
+    ainsi que la relecture de la seule colonne _id en Parquet
+    """
+    directory = tempfile.mkdtemp()
+    results = {}
+    for collection_name in backup_csv.BACKUP_COLLECTIONS:
+        csv_file = os.path.join(directory, f"{collection_name}.csv")
+        parquet_file = os.path.join(directory, f"{collection_name}.parquet")
+        try:
+            results[collection_name] = {
+                "csv": {
+                    "export_s": timed(backup_csv.export_data_to_csv, csv_file, collection_name),
+                    "size_mb": os.path.getsize(csv_file) / 1024 / 1024,
+                    "reload_s": timed(read_csv_documents, csv_file),
+                },
+                "parquet": {
+                    "export_s": timed(backup_csv.export_data_to_parquet, parquet_file, collection_name),
+                    "size_mb": os.path.getsize(parquet_file) / 1024 / 1024,
+                    "reload_s": timed(read_parquet_documents, parquet_file, collection_name),
+                    "reload_id_column_s": timed(read_parquet_documents, parquet_file, collection_name, ["_id"]),
+                },
+            }
+        except FileNotFoundError:
+            # La collection est vide, aucun fichier n'a été créé
+            continue
+        finally:
+            for filename in (csv_file, parquet_file):
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+        for format_name, result in results[collection_name].items():
+            print(f"{collection_name} {format_name}: {result['size_mb']:.1f} Mo, export {result['export_s']:.2f}s, "
+                  f"relecture {result['reload_s']:.2f}s")
+    return results
+
+def generate_posts_csv(filename: str, rows: int) -> None:
+    """
+    Écrit un fichier CSV de posts au format d'import, dont un post sur cinq a des commentaires
+    """
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["id", "userId", "content", "image", "likes", "comments", "createdAt"])
+        for i in range(rows):
+            comments = [{"user_id": str(i % 1000 + j), "comment": f"Commentaire {j}"} for j in range(i % 3 + 1)] \
+                if i % 5 == 0 else []
+            writer.writerow([i, i % 1000, "contenu", f"image{i}.png", "1,2", backup_csv.json.dumps(comments),
+                             "01-11-2024"])
+
+def bench_comments(rows: int = 1_000_000) -> dict:
+    """
+    Compare le débit (lignes/s) du parsing de la colonne comments avec eval() et avec parse_comments()
+    sur un fichier de posts de rows lignes
+    """
+    filename = os.path.join(tempfile.mkdtemp(), "posts.csv")
+    generate_posts_csv(filename, rows)
+    parsers = {"eval": lambda value: eval(value) if value else [], "parse_comments": backup_csv.parse_comments}
+    results = {}
+    try:
+        for name, parse in parsers.items():
+            start = time.perf_counter()
+            with open(filename, 'r', encoding='utf-8', newline='') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    parse(row["comments"])
+            results[name] = rows / (time.perf_counter() - start)
+            print(f"comments {name}: {results[name]:.0f} lignes/s")
+    finally:
+        os.remove(filename)
+    return results
+
+def bench_projection(count: int = 1000, threads: int = 16) -> dict:
+    """
+    Compare la latence de la requête combinée et de la projection en mémoire, puis mesure la latence
+    de la projection sous charge (threads requêtes en parallèle)
+    """
+    user_ids = sample_user_ids(count)
+    projection = recommandations_graph.GraphProjection(recommandations.graph)
+    projection.load()
+
+    combined, memory = [], []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recommandations.get_all_recommendations(user_id)
+        combined.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        projection.recommend(user_id, recommandations.MAX_RECOMMANDATIONS)
+        memory.append(time.perf_counter() - start)
+
+    def timed_recommend(user_id: str) -> float:
+        start = time.perf_counter()
+        projection.recommend(user_id, recommandations.MAX_RECOMMANDATIONS)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        under_load = list(pool.map(timed_recommend, user_ids * 10))
+
+    return {"combined": latency_report("recommandations combinées", combined),
+            "memory": latency_report("recommandations projection", memory),
+            "memory_under_load": latency_report(f"recommandations projection ({threads} threads)", under_load)}
+
+def reset_peak_rss() -> None:
+    """
+    Remet à zéro le pic de mémoire résidente du process (Linux 4.0 et plus), pour mesurer chaque étape séparément.
+    Sans effet sur les autres systèmes, le pic est alors celui de tout le process
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(name: str, function, documents: int) -> dict:
+    """
+    Exécute function() et mesure son débit (documents/s) et le pic de mémoire résidente pendant l'exécution
+    """
+    reset_peak_rss()
+    start = time.perf_counter()
+    function()
+    duration = time.perf_counter() - start
+    result = {"documents": documents, "seconds": duration,
+              "documents_per_second": documents / duration if duration else None, "peak_rss_mb": peak_rss_mb()}
+    print(f"{name}: {documents} documents en {duration:.1f}s ({result['documents_per_second'] or 0:.0f}/s), "
+          f"RSS max {result['peak_rss_mb']:.0f} Mo")
+    return result
+
+def bench_recommendation_latency(user_ids: list, user_count: int) -> dict:
+    """
+    Latence des recommandations de chaque utilisateur: requête combinée dans Neo4j, endpoint
+    /recommendations (client de test Flask, chaque utilisateur n'est demandé qu'une fois donc sans le cache)
+    et projection en mémoire si numpy est installé
+    """
+    results = {}
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recommandations.get_all_recommendations(user_id)
+        latencies.append(time.perf_counter() - start)
+    results["neo4j"] = latency_report("recommandations Neo4j", latencies)
+
+    client = recommandations.app.test_client()
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        client.get(f"/recommendations/{user_id}")
+        latencies.append(time.perf_counter() - start)
+    results["endpoint"] = latency_report("endpoint /recommendations", latencies)
+
+    if recommandations_graph.np is not None:
+        projection = recommandations_graph.GraphProjection(recommandations.graph)
+        results["projection_load"] = measure("chargement projection", projection.load, user_count)
+        latencies = []
+        for user_id in user_ids:
+            start = time.perf_counter()
+            projection.recommend(user_id, recommandations.MAX_RECOMMANDATIONS)
+            latencies.append(time.perf_counter() - start)
+        results["projection"] = latency_report("recommandations projection", latencies)
+    return results
+
+def clean_suite_graph() -> None:
+    """
+    Supprime de Neo4j les noeuds des données générées, et les centres d'intérêt qui n'ont plus d'utilisateurs
+    """
+    middleware_save.neo4j_graph.run("""
+        MATCH (n) WHERE n.id STARTS WITH $prefix
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+    """, prefix=generate_data.ID_PREFIX.hex())
+    middleware_save.neo4j_graph.run("MATCH (i:Interest) WHERE NOT (i)<-[:HAS_INTEREST]-() DELETE i")
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(run: dict, filename: str = RESULTS_FILE) -> None:
+    runs = []
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as results_file:
+            runs = json.load(results_file)
+    runs.append(run)
+    with open(filename, 'w', encoding='utf-8') as results_file:
+        json.dump(runs, results_file, indent=2)
+
+def bench_suite(user_count: int = 100_000, sample_size: int = 500) -> dict:
+    """
+    Benchmark de bout en bout sur des données générées par generate_data: import CSV, export CSV,
+    synchro MongoDB -> Neo4j et latence des recommandations. Le débit, le pic de mémoire résidente
+    et les latences p50/p99 sont ajoutés à RESULTS_FILE avec la date et le commit
+
+    Fonctionnement:
+        - Les fichiers CSV générés sont importés dans la base SUITE_DATABASE avec import_data_from_csv
+        - Les références du CSV sont des numéros de ligne, les documents importés sont donc remplacés par
+          les mêmes données avec des _id liés (comme ceux de l'application) avant l'export et la synchro
+        - La synchro écrit dans le Neo4j configuré, les noeuds générés sont supprimés à la fin
+        - La synchro a son propre checkpoint et son propre verrou, et ne prévient pas le vrai serveur
+          de recommandations (RECOMMENDATIONS_URL)
+    """
+    directory = tempfile.mkdtemp()
+    database = backup_csv.client[SUITE_DATABASE]
+    previous_databases = backup_csv.db, middleware_save.db
+    previous_settings = (middleware_save.SYNC_STATE_DIR, middleware_save.SYNC_LOCK_FILE,
+                         middleware_save.RECOMMENDATIONS_URL)
+    backup_csv.db = middleware_save.db = database
+    # Le checkpoint et le verrou de la synchro de la suite ne doivent pas se mélanger avec ceux de la vraie synchro
+    middleware_save.SYNC_STATE_DIR = os.path.join(directory, "sync-state")
+    middleware_save.SYNC_LOCK_FILE = os.path.join(directory, "sync.lock")
+    middleware_save.RECOMMENDATIONS_URL = None
+    results = {}
+
+    def synchronize():
+        # Une synchro annulée durerait presque 0s et fausserait les résultats
+        if not middleware_save.full_synchronization():
+            raise RuntimeError("La synchro de la suite n'a pas été exécutée (verrou déjà pris)")
+    try:
+        print(f"Génération de {user_count} utilisateurs...")
+        counts = generate_data.write_csv(directory, user_count)
+
+        backup_csv.client.drop_database(SUITE_DATABASE)
+        results["import"] = {collection: measure(f"import {collection}", partial(
+            backup_csv.import_data_from_csv, os.path.join(directory, filename), collection), counts[collection])
+            for collection, filename in generate_data.CSV_FILES.items()}
+
+        backup_csv.client.drop_database(SUITE_DATABASE)
+        generate_data.insert_documents(database, user_count)
+        results["export"] = {collection: measure(f"export {collection}", partial(
+            backup_csv.export_data_to_csv, os.path.join(directory, f"{collection}_export.csv"), collection),
+            counts[collection]) for collection in generate_data.CSV_FILES}
+
+        results["sync"] = measure("synchro", synchronize, sum(counts.values()))
+
+        sample = random.sample(range(user_count), min(sample_size, user_count))
+        results["recommendations"] = bench_recommendation_latency(
+            [generate_data.document_id("users", index).hex() for index in sample], user_count)
+    finally:
+        backup_csv.db, middleware_save.db = previous_databases
+        (middleware_save.SYNC_STATE_DIR, middleware_save.SYNC_LOCK_FILE,
+         middleware_save.RECOMMENDATIONS_URL) = previous_settings
+        backup_csv.client.drop_database(SUITE_DATABASE)
+        clean_suite_graph()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    save_results({"date": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+                  "users": user_count, "counts": counts, "results": results})
+    print(f"Résultats ajoutés à {RESULTS_FILE}")
+    return results
+
+BENCHMARKS = {
+    "merge": bench_merge,
+    "recommendations": bench_recommendations,
+    "traversal": bench_traversal,
+    "export": bench_export,
+    "formats": bench_formats,
+    "comments": bench_comments,
+    "projection": bench_projection,
+    "suite": bench_suite,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Benchmarks disponibles: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*(int(arg) for arg in sys.argv[2:]))
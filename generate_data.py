@@ -0,0 +1,282 @@
+"""
+Génère des données synthétiques de réseau social aux formats d'import CSV (csv data/imports),
+pour tester les imports, exports, la synchro et les recommandations à grande échelle (10^5 à 10^7 utilisateurs)
+
+Les nombres d'amis, de posts, de likes... suivent une loi de puissance: la plupart des utilisateurs
+en ont peu et quelques-uns énormément, et les utilisateurs, groupes et pages les plus populaires sont
+beaucoup plus souvent choisis (comme dans un vrai réseau social). Les documents sont générés au fil de
+l'écriture, la mémoire utilisée ne dépend pas du nombre d'utilisateurs.
+Les listes d'amis ne sont pas symétriques et members/followers des groupes et des pages restent vides
+(la synchro lit les adhésions dans users.groups et users.pages), sinon il faudrait tout garder en mémoire.
+
+Utilisation:
+    python generate_data.py [nombre d'utilisateurs] [dossier]
+"""
+import csv
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+from itertools import islice
+from bson.binary import Binary
+
+# Dossier où sont écrits les fichiers CSV par défaut
+OUTPUT_DIR = os.path.join("csv data", "generated")
+
+# Fichier CSV de chaque collection, mêmes noms que dans csv data/imports
+CSV_FILES = {
+    "users": "user_data.csv",
+    "group": "group_data.csv",
+    "pages": "pages_data.csv",
+    "posts": "post_data.csv",
+    "privates_messages": "privates_messages_data.csv",
+}
+
+# Nombre de groupes et de pages par utilisateur
+GROUPS_PER_USER = 0.02
+PAGES_PER_USER = 0.01
+# Moyennes des nombres générés avec une loi de puissance, et leurs maximums
+MEAN_FRIENDS, MAX_FRIENDS = 20, 5000
+MEAN_GROUPS, MAX_GROUPS = 3, 200
+MEAN_PAGES, MAX_PAGES = 5, 500
+MEAN_POSTS, MAX_POSTS = 2, 1000
+MEAN_LIKES, MAX_LIKES = 5, 10_000
+MEAN_INTERESTS, MAX_INTERESTS = 2, 10
+# Nombre de messages privés par utilisateur
+MESSAGES_PER_USER = 2
+# Part des posts qui ont des commentaires (de 1 à 3)
+COMMENT_RATE = 0.2
+# Exposant alpha de la loi de Pareto des nombres générés (plus il est petit, plus la queue est longue)
+POWER_LAW_ALPHA = 1.5
+# Concentration de la popularité: le document de rang r est choisi avec une probabilité proportionnelle
+# à r^(1/POPULARITY_SKEW - 1), 1 pour un choix uniforme
+POPULARITY_SKEW = 3.0
+
+# Les _id générés commencent par ce préfixe, pour retrouver et supprimer les données générées
+ID_PREFIX = b"synth"
+INSERT_BATCH_SIZE = 1000
+
+INTERESTS = ["musique", "sport", "cinéma", "jeux vidéo", "lecture", "voyage", "cuisine", "photographie",
+             "informatique", "football", "basketball", "danse", "théâtre", "art", "histoire", "sciences",
+             "mode", "animaux", "nature", "randonnée", "natation", "séries", "mangas", "politique",
+             "écologie", "automobile", "jardinage", "astronomie", "échecs", "programmation"]
+FIRST_NAMES = ["Yassine", "Jean", "Jane", "Marie", "Lucas", "Emma", "Hugo", "Léa", "Louis", "Chloé",
+               "Nathan", "Inès", "Adam", "Sarah", "Wissem", "Camille", "Noah", "Manon", "Théo", "Jade"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+              "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "Doe", "El Hali", "Inoubli"]
+WORDS = ["bonjour", "tout", "le", "monde", "on", "travaille", "sur", "la", "SAE", "aujourd'hui", "super",
+         "journée", "merci", "à", "vous", "je", "suis", "content", "de", "partager", "ce", "moment", "avec",
+         "mes", "amis", "qui", "vient", "au", "concert", "ce", "soir", "?", "!"]
+
+def power_law_count(rng: random.Random, mean: float, maximum: int) -> int:
+    """
+    Nombre entier tiré d'une loi de Pareto d'exposant POWER_LAW_ALPHA, de moyenne environ mean
+    """
+    return min(maximum, int((rng.paretovariate(POWER_LAW_ALPHA) - 1) * mean * (POWER_LAW_ALPHA - 1)))
+
+def popular_index(rng: random.Random, count: int) -> int:
+    """
+    Index entre 0 et count - 1, les petits index (les documents populaires) sont beaucoup plus souvent choisis
+    """
+    return min(count - 1, int(count * rng.random() ** POPULARITY_SKEW))
+
+def popular_indexes(rng: random.Random, amount: int, count: int, exclude: int = None) -> list:
+    """
+    Jusqu'à amount index différents choisis par popular_index (les doublons tirés sont ignorés)
+    """
+    indexes = {popular_index(rng, count) for _ in range(min(amount, count))}
+    indexes.discard(exclude)
+    return sorted(indexes)
+
+def random_date(rng: random.Random, first_year: int, last_year: int) -> str:
+    start = date(first_year, 1, 1)
+    days = (date(last_year, 12, 31) - start).days
+    return (start + timedelta(days=rng.randrange(days))).strftime("%d-%m-%Y")
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(max(1, words)))
+
+def collection_sizes(user_count: int) -> dict:
+    return {"users": user_count,
+            "group": max(1, int(user_count * GROUPS_PER_USER)),
+            "pages": max(1, int(user_count * PAGES_PER_USER))}
+
+def generate_users(user_count: int, seed: int = 0):
+    """
+    Génère les utilisateurs, les références (friends, groups, pages) sont des index de documents
+    """
+    sizes = collection_sizes(user_count)
+    rng = random.Random(f"{seed}:users")
+    for index in range(user_count):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            "index": index,
+            "username": f"{first_name.lower()}_{last_name.lower().replace(' ', '')}_{index}",
+            "avatar": f"avatar{index % 1000}.png",
+            "bio": random_text(rng, rng.randint(3, 15)),
+            "interests": [INTERESTS[i] for i in popular_indexes(
+                rng, power_law_count(rng, MEAN_INTERESTS, MAX_INTERESTS), len(INTERESTS))],
+            "first_name": first_name,
+            "last_name": last_name,
+            "mail": f"user{index}@example.com",
+            "password": "token.exemple.a1b2c3",
+            "role": "admin" if rng.random() < 0.001 else "user",
+            "birthdate": random_date(rng, 1960, 2008),
+            "friends": popular_indexes(rng, power_law_count(rng, MEAN_FRIENDS, MAX_FRIENDS), user_count, index),
+            "groups": popular_indexes(rng, power_law_count(rng, MEAN_GROUPS, MAX_GROUPS), sizes["group"]),
+            "pages": popular_indexes(rng, power_law_count(rng, MEAN_PAGES, MAX_PAGES), sizes["pages"]),
+            "createdAt": random_date(rng, 2020, 2024),
+        }
+
+def generate_groups(user_count: int, seed: int = 0):
+    rng = random.Random(f"{seed}:group")
+    for index in range(collection_sizes(user_count)["group"]):
+        yield {"index": index, "name": f"Groupe {index}", "description": random_text(rng, rng.randint(3, 20)),
+               "members": [], "createdBy": popular_index(rng, user_count), "createdAt": random_date(rng, 2020, 2024)}
+
+def generate_pages(user_count: int, seed: int = 0):
+    rng = random.Random(f"{seed}:pages")
+    for index in range(collection_sizes(user_count)["pages"]):
+        yield {"index": index, "image": f"image{index}.png", "name": f"Page {index}",
+               "description": random_text(rng, rng.randint(3, 20)), "followers": [],
+               "createdBy": popular_index(rng, user_count), "createdAt": random_date(rng, 2020, 2024)}
+
+def generate_posts(user_count: int, seed: int = 0):
+    """
+    Génère les posts de chaque utilisateur, avec leurs likes et parfois des commentaires
+    """
+    rng = random.Random(f"{seed}:posts")
+    index = 0
+    for author in range(user_count):
+        for _ in range(power_law_count(rng, MEAN_POSTS, MAX_POSTS)):
+            comments = [{"user": popular_index(rng, user_count), "comment": random_text(rng, rng.randint(1, 10))}
+                        for _ in range(rng.randint(1, 3))] if rng.random() < COMMENT_RATE else []
+            yield {"index": index, "userId": author, "content": random_text(rng, rng.randint(1, 40)),
+                   "image": f"image{index % 1000}.png" if rng.random() < 0.3 else "",
+                   "likes": popular_indexes(rng, power_law_count(rng, MEAN_LIKES, MAX_LIKES), user_count, author),
+                   "comments": comments, "createdAt": random_date(rng, 2020, 2024)}
+            index += 1
+
+def generate_private_messages(user_count: int, seed: int = 0):
+    rng = random.Random(f"{seed}:privates_messages")
+    for index in range(user_count * MESSAGES_PER_USER):
+        sender = popular_index(rng, user_count)
+        receiver = popular_index(rng, user_count)
+        if receiver == sender:
+            receiver = (receiver + 1) % user_count
+        yield {"index": index, "sender_id": sender, "receiver_id": receiver,
+               "content": random_text(rng, rng.randint(1, 30)), "createdAt": random_date(rng, 2020, 2024)}
+
+GENERATORS = {
+    "users": generate_users,
+    "group": generate_groups,
+    "pages": generate_pages,
+    "posts": generate_posts,
+    "privates_messages": generate_private_messages,
+}
+
+# Colonnes du CSV d'import de chaque collection, dans l'ordre de csv data/imports
+CSV_COLUMNS = {
+    "users": ["username", "avatar", "bio", "interests", "first_name", "last_name", "mail", "password", "role",
+              "birthdate", "friends", "groups", "pages", "createdAt"],
+    "group": ["name", "description", "members", "createdBy", "createdAt"],
+    "pages": ["image", "name", "description", "followers", "createdBy", "createdAt"],
+    "posts": ["id", "userId", "content", "image", "likes", "comments", "createdAt"],
+    "privates_messages": ["sender_id", "receiver_id", "content", "createdAt"],
+}
+
+# Colonnes qui référencent d'autres documents (une liste ou un seul index)
+REFERENCES = {
+    "users": {"friends": "users", "groups": "group", "pages": "pages"},
+    "group": {"members": "users", "createdBy": "users"},
+    "pages": {"followers": "users", "createdBy": "users"},
+    "posts": {"userId": "users", "likes": "users"},
+    "privates_messages": {"sender_id": "users", "receiver_id": "users"},
+}
+
+def csv_row(collection: str, document: dict) -> list:
+    """
+    Ligne du CSV d'import: comme dans csv data/imports, une référence est le numéro de ligne (à partir de 1)
+    du document référencé et les listes sont écrites "a,b,c"
+    """
+    row = dict(document, id=document["index"] + 1)
+    for field in REFERENCES[collection]:
+        value = row[field]
+        row[field] = ",".join(str(index + 1) for index in value) if isinstance(value, list) else value + 1
+    if collection == "users":
+        row["interests"] = ",".join(row["interests"])
+    if collection == "posts":
+        row["comments"] = json.dumps([{"user_id": str(comment["user"] + 1), "comment": comment["comment"]}
+                                      for comment in row["comments"]], ensure_ascii=False)
+    return [row[column] for column in CSV_COLUMNS[collection]]
+
+def write_csv(directory: str, user_count: int, seed: int = 0) -> dict:
+    """
+    Écrit les fichiers CSV_FILES de toutes les collections dans directory
+
+    Retourne:
+        dict: collection -> nombre de lignes écrites
+    """
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for collection, generate in GENERATORS.items():
+        with open(os.path.join(directory, CSV_FILES[collection]), 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(CSV_COLUMNS[collection])
+            counts[collection] = 0
+            for document in generate(user_count, seed):
+                writer.writerow(csv_row(collection, document))
+                counts[collection] += 1
+        print(f"Génération {collection}: {counts[collection]} lignes")
+    return counts
+
+def document_id(collection: str, index: int) -> Binary:
+    """
+    _id du document généré, un UUID binaire comme ceux de l'application: ID_PREFIX,
+    le numéro de la collection puis l'index
+    """
+    code = list(GENERATORS).index(collection)
+    return Binary(ID_PREFIX + bytes([code]) + index.to_bytes(16 - len(ID_PREFIX) - 1, "big"), 3)
+
+def mongo_document(collection: str, document: dict) -> dict:
+    """
+    Document MongoDB avec des _id liés (ce que lit la synchro), au lieu des numéros de ligne du CSV
+    """
+    result = {key: value for key, value in document.items() if key != "index"}
+    result["_id"] = document_id(collection, document["index"])
+    for field, target in REFERENCES[collection].items():
+        value = document[field]
+        result[field] = [document_id(target, index) for index in value] if isinstance(value, list) \
+            else document_id(target, value)
+    if "createdBy" in result:
+        # Le document du créateur est copié dans createdBy, la synchro n'en lit que l'_id
+        result["createdBy"] = {"_id": result["createdBy"]}
+    if collection == "posts":
+        result["comments"] = [{"user_id": document_id("users", comment["user"]).hex(), "comment": comment["comment"]}
+                              for comment in document["comments"]]
+    return result
+
+def insert_documents(db, user_count: int, seed: int = 0, batch_size: int = INSERT_BATCH_SIZE) -> dict:
+    """
+    Insère directement dans la base MongoDB db les mêmes données que write_csv, avec des _id liés
+
+    Retourne:
+        dict: collection -> nombre de documents insérés
+    """
+    counts = {}
+    for collection, generate in GENERATORS.items():
+        documents = (mongo_document(collection, document) for document in generate(user_count, seed))
+        counts[collection] = 0
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                break
+            db[collection].insert_many(batch, ordered=False)
+            counts[collection] += len(batch)
+        print(f"Insertion {collection}: {counts[collection]} documents")
+    return counts
+
+if __name__ == "__main__":
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    write_csv(sys.argv[2] if len(sys.argv) > 2 else OUTPUT_DIR, user_count)
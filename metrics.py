@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites des histogrammes de durées (en secondes) et de tailles de paquets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Profil des requêtes Cypher (PROFILE): quand PROFILE_QUERIES est vrai, chaque requête est exécutée avec PROFILE
+# et son plan (db hits et lignes par opérateur) est ajouté en JSON à PROFILE_FILE. À n'activer que pour analyser,
+# PROFILE ralentit les requêtes
+PROFILE_QUERIES = False
+PROFILE_FILE = "query_profiles.jsonl"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = []
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+class Metric:
+    """
+    Métrique au format Prometheus, avec une valeur par combinaison de labels
+    """
+    type = None
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines += self.render_value(key, value)
+        return lines
+
+    def render_value(self, key: tuple, value) -> list:
+        return [f"{self.name}{format_labels(self.labels, key)} {value}"]
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Un compteur par limite, puis la somme et le nombre d'observations
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[position] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Mesure la durée du bloc with, même s'il lève une exception
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render_value(self, key: tuple, counts: list) -> list:
+        lines = []
+        for bucket, count in zip(self.buckets + ("+Inf",), counts[:-2] + [counts[-1]]):
+            bucket_label = 'le="%s"' % bucket
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, bucket_label)} {count}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {counts[-2]}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+def render() -> str:
+    """
+    Toutes les métriques du process au format texte de Prometheus
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+# Métriques communes aux deux services
+neo4j_query_seconds = Histogram("neo4j_query_seconds", "Durée des requêtes Cypher (un aller-retour Bolt chacune)")
+neo4j_db_hits = Counter("neo4j_db_hits_total", "DB hits des requêtes profilées (PROFILE_QUERIES)")
+
+def plan_operators(plan: dict) -> list:
+    """
+    Liste à plat des opérateurs d'un plan PROFILE renvoyé par Neo4j, avec leurs db hits et lignes
+    """
+    operators = [{"operator": plan.get("operatorType"), "db_hits": plan.get("dbHits", 0), "rows": plan.get("rows", 0)}]
+    for child in plan.get("children", []):
+        operators += plan_operators(child)
+    return operators
+
+profile_lock = threading.Lock()
+
+def run_cypher(graph, query: str, **parameters) -> list:
+    """
+    Exécute une requête Cypher en mesurant sa durée, et la profile si PROFILE_QUERIES est vrai
+
+    Retourne:
+        list: Les lignes du résultat sous forme de dictionnaires
+    """
+    with neo4j_query_seconds.time():
+        # Les commandes d'administration ne peuvent pas être profilées
+        if not PROFILE_QUERIES or query.lstrip().startswith(("SHOW", "TERMINATE", "CREATE CONSTRAINT")):
+            return graph.run(query, **parameters).data()
+        cursor = graph.run(f"PROFILE {query}", **parameters)
+        data = cursor.data()
+
+    operators = plan_operators(cursor.plan() or {})
+    db_hits = sum(operator["db_hits"] for operator in operators)
+    neo4j_db_hits.inc(db_hits)
+    with profile_lock, open(PROFILE_FILE, "a", encoding="utf-8") as profile_file:
+        profile_file.write(json.dumps({"query": " ".join(query.split()), "db_hits": db_hits,
+                                       "rows": len(data), "operators": operators}) + "\n")
+    return data
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port: int) -> ThreadingHTTPServer:
+    """
+    Sert /metrics sur le port dans un thread en arrière-plan, pour les process sans serveur web (middleware)
+    """
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
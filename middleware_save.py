@@ -1,9 +1,29 @@
 import schedule
+import csv
+import fcntl
+import heapq
+import sys
+import os
+import json
+import shutil
+import threading
 import time
+import traceback
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from operator import itemgetter
+from itertools import islice
 from pymongo import MongoClient
-from py2neo import Graph, Node, Relationship, NodeMatcher
+from py2neo import Graph
+from bson import Decimal128, MaxKey, ObjectId, Timestamp, json_util
 from bson.binary import Binary
 
+import metrics
+
 # Connexion à la bdd MongoDB
 mongo_client = MongoClient("mongodb://localhost:27017")
 # test database
@@ -12,7 +32,125 @@ db = mongo_client.socialnetworkdb
 
 # Connexion à la bdd Neo4j
 neo4j_graph = Graph("bolt://localhost:7687", auth=("neo4j", "rootroot"))
-matcher = NodeMatcher(neo4j_graph)
+
+# Nombre de documents envoyés à Neo4j dans une seule requête UNWIND
+BATCH_SIZE = 1000
+
+# Labels des noeuds synchronisés, chacun a une contrainte d'unicité sur id
+# (les noeuds Interest sont créés à partir des centres d'intérêt des utilisateurs, leur id est le nom normalisé)
+NODE_LABELS = ["Users", "Group", "Pages", "Posts", "PrivateMessage", "Interest"]
+
+# Labels des noeuds de départ et d'arrivée de chaque type de relation
+RELATIONSHIPS = {
+    "FRIENDS": ("Users", "Users"),
+    "MEMBER_OF": ("Users", "Group"),
+    "FOLLOWS": ("Users", "Pages"),
+    "LIKES": ("Users", "Posts"),
+    "POSTED": ("Users", "Posts"),
+    "CREATED_GROUP": ("Users", "Group"),
+    "CREATED_PAGE": ("Users", "Pages"),
+    "SEND_MESSAGE": ("Users", "PrivateMessage"),
+    "RECEIVE_MESSAGE": ("PrivateMessage", "Users"),
+    "HAS_INTEREST": ("Users", "Interest"),
+}
+
+# Relations dont le document MongoDB qui les contient est le noeud de départ,
+# pour les autres le document est le noeud d'arrivée (ex: les likes sont stockés dans le post)
+OWNED_AT_START = {"FRIENDS", "MEMBER_OF", "FOLLOWS", "RECEIVE_MESSAGE", "HAS_INTEREST"}
+
+# Relations lues par le service de recommandations: quand une de ces relations est créée ou supprimée,
+# les recommandations en cache de l'utilisateur de départ sont invalidées
+RECOMMENDATION_RELATIONSHIPS = {"FRIENDS", "MEMBER_OF", "FOLLOWS", "HAS_INTEREST"}
+
+# Adresse du service de recommandations à prévenir, None pour ne pas le prévenir
+RECOMMENDATIONS_URL = "http://localhost:5001"
+
+# Nombre d'étapes de synchro exécutées en parallèle
+SYNC_WORKERS = 4
+
+# Nombre maximum de requêtes envoyées à Neo4j en même temps par tous les threads,
+# le pool de connexions de py2neo ne dépasse donc pas cette taille
+MAX_IN_FLIGHT = SYNC_WORKERS
+
+# Nombre maximum d'id gardés en mémoire par le cache de résolution
+ID_CACHE_SIZE = 1_000_000
+
+# Fichier où on sauvegarde le resume token du change stream et les high-water marks du polling
+CDC_STATE_FILE = "cdc_state.json"
+
+# Temps maximum (en secondes) avant d'appliquer un paquet de changements incomplet
+CDC_MAX_WAIT = 1.0
+
+# Dossier où la synchro complète sauvegarde son checkpoint (state.json) et les relations mises de côté,
+# une synchro interrompue reprend à partir de ce checkpoint. Il est supprimé à la fin d'une synchro réussie
+SYNC_STATE_DIR = "sync-state"
+# Fichier verrou (flock) qui empêche deux synchros complètes, ou une synchro et une réconciliation,
+# de tourner en même temps (il contient le pid du process qui a le verrou)
+SYNC_LOCK_FILE = "sync.lock"
+# Heures des synchros complètes planifiées
+FULL_SYNC_TIMES = ["00:00"]
+# Types possibles d'un _id ($type), dans l'ordre de tri de MongoDB. $gt ne compare que des valeurs du même type,
+# la reprise d'un parcours par _id croissant doit donc aussi prendre les _id des types suivants
+ID_TYPE_ORDER = [
+    (("int", "long", "double", "decimal"), (int, float, Decimal128)),
+    (("string",), (str,)),
+    (("object",), (dict,)),
+    (("binData",), (bytes,)),
+    (("objectId",), (ObjectId,)),
+    (("bool",), (bool,)),
+    (("date",), (datetime,)),
+    (("timestamp",), (Timestamp,)),
+    (("maxKey",), (MaxKey,)),
+]
+
+# Port du serveur qui expose les métriques de la synchro au format Prometheus (/metrics), None pour ne pas le lancer
+METRICS_PORT = 9101
+
+# Dossier où sont écrits les fichiers d'import en masse (neo4j-admin database import)
+BULK_IMPORT_DIR = "neo4j-import"
+# Séparateur des éléments des listes dans les fichiers d'import en masse
+BULK_ARRAY_DELIMITER = ";"
+
+# Champ utilisé comme high-water mark par collection en mode polling
+# (mettre "_id" pour une collection dont les _id sont des ObjectId). Les documents de l'application n'ont
+# que createdAt (voir csv data/exports): le polling voit les créations mais pas les modifications,
+# mettre "updatedAt" quand l'application l'écrira
+POLL_WATERMARK_FIELDS = {
+    "users": "createdAt",
+    "group": "createdAt",
+    "pages": "createdAt",
+    "posts": "createdAt",
+    "privates_messages": "createdAt",
+}
+
+# Propriétés copiées sur les noeuds en plus de id, par label. Par défaut seulement ce que lit le service
+# de recommandations (le nom des groupes et des pages) : les mots de passe, mails, bios, contenus des posts...
+# restent dans MongoDB et ne gonflent pas le store et le page cache de Neo4j
+NODE_PROPERTIES = {
+    "Users": [],
+    "Group": ["name"],
+    "Pages": ["name"],
+    "Posts": [],
+    "PrivateMessage": [],
+    "Interest": ["name"],
+}
+# Propriétés supplémentaires à copier quand une requête en a besoin, ex: {"Users": ["username"], "Posts": ["createdAt"]}
+# Champs disponibles: Users: username, avatar, bio, interests, first_name, last_name, mail, password, role,
+# birthdate, createdAt / Group: description, createdAt / Pages: description, createdBy, createdAt /
+# Posts: content, image, createdAt / PrivateMessage: content, createdAt
+EXTRA_NODE_PROPERTIES = {}
+
+# Dossier du store Neo4j (ex: "/var/lib/neo4j/data/databases/neo4j") pour mesurer sa taille dans le rapport
+# de strip_properties, None si Neo4j tourne sur une autre machine
+NEO4J_STORE_DIR = None
+
+# Métriques de la synchro, exposées sur METRICS_PORT
+sync_step_seconds = metrics.Gauge("sync_step_seconds", "Durée de la dernière exécution de chaque étape", ("step",))
+sync_documents = metrics.Counter("sync_documents_total", "Documents MongoDB traités", ("collection",))
+sync_batch_size = metrics.Histogram("sync_batch_size", "Nombre de lignes par requête UNWIND envoyée à Neo4j",
+                                    ("target",), metrics.SIZE_BUCKETS)
+mongo_fetch_seconds = metrics.Histogram("mongo_fetch_seconds", "Attente du curseur MongoDB pour chaque paquet",
+                                        ("collection",))
 
 # Fonction pour converti de binaire en un string car on peut pas enregistrer en Binary directement
 def binary_id_to_str(id):
@@ -23,215 +161,1377 @@ def binary_id_to_str(id):
         return id.hex()
     return str(id)
 
-def sync_users():
-    """
-    Synchronise la collection users de MongoDB vers Neo4j sans supprimer les anciens noeuds
-    """
-    for user in db.users.find():
-        user_id = binary_id_to_str(user["_id"])
-
-        neo4j_user = Node("Users",
-                          id=user_id,
-                          username=user["username"],
-                          avatar=user["avatar"],
-                          bio=user["bio"],
-                          interests=user["interests"],
-                          first_name=user["first_name"],
-                          last_name=user["last_name"],
-                          mail=user["mail"],
-                          password=user["password"],
-                          role=user["role"],
-                          birthdate=user["birthdate"],
-                          createdAt=user["createdAt"])
-        # Créer le noeud, s'il existe déjà ça met juste à jour les valeurs du noeud existant
-        neo4j_graph.merge(neo4j_user, "Users", "id")
-        
-    print("Synch users: terminé")
-
-def sync_groups():
-    """
-    Synchronise la collection group de MongoDB vers Neo4j sans supprimer les anciens noeuds
-    """
-    for group in db.group.find():
-        group_id = binary_id_to_str(group["_id"])
-        if len(group["createdBy"]) > 0:
-            createdBy_id = binary_id_to_str(group["createdBy"]["_id"])
-        else:
-            createdBy_id = "None"
-        neo4j_group = Node("Group",
-                           id=group_id,
-                           name=group["name"],
-                           description=group["description"], 
-                           createdAt=group["createdAt"])
-        # Pareil que dans sync_users()
-        neo4j_graph.merge(neo4j_group, "Group", "id")
-
-        # Créer la relation "CREATES" entre l'utilisateur et son post
-        userId = createdBy_id
-        neo4j_user = matcher.match("Users", id=userId).first()
-        if neo4j_user:
-            neo4j_graph.merge(Relationship(neo4j_user, "CREATED_GROUP", neo4j_group))
-        
-    print("Synch group: terminé")
-
-def sync_pages():
-    """
-    Synchronise la collection pages de MongoDB vers Neo4j sans supprimer les anciens noeuds
-    """
-    for page in db.pages.find():
-        page_id = binary_id_to_str(page["_id"])
-        if len(page["createdBy"]) > 0:
-            createdBy_id = binary_id_to_str(page["createdBy"]["_id"])
+def batched(iterable, size: int = BATCH_SIZE):
+    """
+    Découpe un itérable (ex: un curseur MongoDB) en listes d'au plus size éléments
+    sans charger tout l'itérable en mémoire
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class IdCache:
+    """
+    Cache LRU qui retient si un id existe dans Neo4j pour un label donné, pour ne pas
+    refaire une requête par id quand on crée les relations.
+    Les id absents du cache sont résolus par paquets avec une seule requête.
+    """
+
+    def __init__(self, max_size: int = ID_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        # Le cache est partagé par les étapes de synchro exécutées en parallèle
+        self.lock = threading.Lock()
+
+    def _store(self, label: str, id: str, exists: bool) -> None:
+        key = (label, id)
+        self.entries[key] = exists
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def add(self, label: str, ids) -> None:
+        """
+        Enregistre des id qui viennent d'être créés dans Neo4j
+        """
+        with self.lock:
+            for id in ids:
+                self._store(label, id, True)
+
+    def resolve(self, label: str, ids) -> set:
+        """
+        Retourne les id parmi ids qui existent dans Neo4j pour le label
+
+        Args:
+            label (str): Le label des noeuds
+            ids: Les id à vérifier
+
+        Retourne:
+            set: Les id existants
+        """
+        existing = set()
+        missing = set()
+        with self.lock:
+            for id in ids:
+                key = (label, id)
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    if self.entries[key]:
+                        existing.add(id)
+                else:
+                    missing.add(id)
+
+        for batch in batched(missing):
+            found = {record["id"] for record in run_query(
+                f"MATCH (n:{label}) WHERE n.id IN $ids RETURN n.id AS id", ids=batch)}
+            with self.lock:
+                for id in batch:
+                    self._store(label, id, id in found)
+            existing |= found
+        return existing
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def discard(self, label: str, ids) -> None:
+        """
+        Enregistre des id qui viennent d'être supprimés de Neo4j
+        """
+        with self.lock:
+            for id in ids:
+                self._store(label, id, False)
+
+id_cache = IdCache()
+
+in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+def run_query(query: str, **parameters) -> list:
+    """
+    Exécute une requête Cypher en limitant le nombre de requêtes en cours à MAX_IN_FLIGHT,
+    chaque requête utilise sa propre connexion du pool de py2neo
+
+    Retourne:
+        list: Les lignes du résultat sous forme de dictionnaires
+    """
+    with in_flight:
+        return metrics.run_cypher(neo4j_graph, query, **parameters)
+
+def create_constraints():
+    """
+    Crée les contraintes d'unicité sur id pour chaque label, pour que les MERGE utilisent un index
+    """
+    for label in NODE_LABELS:
+        run_query(f"CREATE CONSTRAINT {label.lower()}_id IF NOT EXISTS "
+                  f"FOR (n:{label}) REQUIRE n.id IS UNIQUE")
+
+def merge_nodes(label: str, rows: list, batch_size: int = BATCH_SIZE) -> None:
+    """
+    Crée ou met à jour les noeuds label par paquets avec une seule requête UNWIND par paquet
+
+    Args:
+        label (str): Le label des noeuds
+        rows (list): Les propriétés de chaque noeud, doivent contenir la clé id
+        batch_size (int): Le nombre de noeuds envoyés par requête
+    """
+    query = f"""
+        UNWIND $rows AS row
+        MERGE (n:{label} {{id: row.id}})
+        SET n += row
+    """
+    for batch in batched(rows, batch_size):
+        sync_batch_size.observe(len(batch), target=label)
+        run_query(query, rows=batch)
+        id_cache.add(label, (row["id"] for row in batch))
+
+def merge_relationships(rel_type: str, pairs, batch_size: int = BATCH_SIZE) -> None:
+    """
+    Crée les relations rel_type entre deux noeuds à partir de leurs id, par paquets.
+    Les paires dont un des noeuds n'existe pas sont ignorées avant l'envoi grâce à id_cache.
+
+    Args:
+        rel_type (str): Le type de la relation, clé de RELATIONSHIPS
+        pairs: Itérable de tuples (id de départ, id d'arrivée)
+        batch_size (int): Le nombre de relations envoyées par requête
+    """
+    start_label, end_label = RELATIONSHIPS[rel_type]
+    # On récupère les noeuds de départ dont la relation n'existait pas encore pour invalider leurs recommandations
+    query = f"""
+        UNWIND $pairs AS pair
+        MATCH (a:{start_label} {{id: pair.start}})
+        MATCH (b:{end_label} {{id: pair.end}})
+        OPTIONAL MATCH (a)-[existing:{rel_type}]->(b)
+        MERGE (a)-[:{rel_type}]->(b)
+        WITH a, existing WHERE existing IS NULL
+        RETURN DISTINCT a.id AS id
+    """
+    for batch in batched(pairs, batch_size):
+        existing_starts = id_cache.resolve(start_label, {start for start, _ in batch})
+        existing_ends = id_cache.resolve(end_label, {end for _, end in batch})
+        rows = [{"start": start, "end": end} for start, end in batch
+                if start in existing_starts and end in existing_ends]
+        if rows:
+            sync_batch_size.observe(len(rows), target=rel_type)
+            created = run_query(query, pairs=rows)
+            if rel_type in RECOMMENDATION_RELATIONSHIPS:
+                record_changed_users(record["id"] for record in created)
+
+changed_users = set()
+changed_users_lock = threading.Lock()
+
+def record_changed_users(ids) -> None:
+    with changed_users_lock:
+        changed_users.update(ids)
+
+def notify_recommendations() -> None:
+    """
+    Envoie au service de recommandations les utilisateurs dont les relations ont changé depuis
+    le dernier appel, pour qu'il supprime leurs recommandations de son cache.
+    Une erreur de connexion n'arrête pas la synchro, les recommandations expireront avec leur TTL.
+    """
+    with changed_users_lock:
+        user_ids = list(changed_users)
+        changed_users.clear()
+    if RECOMMENDATIONS_URL is None or not user_ids:
+        return
+
+    try:
+        for batch in batched(user_ids):
+            invalidate_request = urllib.request.Request(f"{RECOMMENDATIONS_URL}/recommendations/invalidate",
+                                                        data=json.dumps({"user_ids": batch}).encode("utf-8"),
+                                                        headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(invalidate_request, timeout=10).close()
+        print(f"Recommandations invalidées: {len(user_ids)} utilisateurs")
+    except (urllib.error.URLError, OSError) as error:
+        print(f"Impossible de prévenir le service de recommandations: {error}")
+
+def creator_id(document) -> str:
+    """
+    Récupère l'id du créateur d'un groupe ou d'une page, "None" s'il n'y en a pas
+    """
+    if len(document["createdBy"]) > 0:
+        return binary_id_to_str(document["createdBy"]["_id"])
+    return "None"
+
+# Propriétés dont la valeur ne vient pas du champ MongoDB du même nom: champ lu et fonction de conversion
+# (createdBy contient tout le document du créateur, on ne lit que son _id)
+PROPERTY_SOURCES = {
+    "createdBy": ("createdBy._id", creator_id),
+}
+
+def projected_properties(label: str) -> list:
+    """
+    Propriétés gardées sur les noeuds label: id, celles de NODE_PROPERTIES puis celles de EXTRA_NODE_PROPERTIES
+    """
+    names = ["id"] + NODE_PROPERTIES.get(label, []) + EXTRA_NODE_PROPERTIES.get(label, [])
+    return list(dict.fromkeys(names))
+
+def node_fields(label: str) -> list:
+    """
+    Champs MongoDB à lire pour construire les propriétés des noeuds label
+    """
+    return [PROPERTY_SOURCES.get(name, (name, None))[0] for name in projected_properties(label)[1:]]
+
+def node_properties(label: str, document) -> dict:
+    """
+    Propriétés du noeud label d'un document, limitées à projected_properties(label)
+    """
+    properties = {"id": binary_id_to_str(document["_id"])}
+    for name in projected_properties(label)[1:]:
+        _, convert = PROPERTY_SOURCES.get(name, (name, None))
+        properties[name] = convert(document) if convert else document.get(name)
+    return properties
+
+def user_friends(user) -> list:
+    return [binary_id_to_str(friend_id) for friend_id in user.get("friends", [])]
+
+def user_groups(user) -> list:
+    return [binary_id_to_str(group_id) for group_id in user.get("groups", [])]
+
+def user_pages(user) -> list:
+    return [binary_id_to_str(page_id) for page_id in user.get("pages", [])]
+
+def document_creator(document) -> list:
+    return [creator_id(document)]
+
+def post_author(post) -> list:
+    return [binary_id_to_str(post["userId"])]
+
+def post_likes(post) -> list:
+    return [binary_id_to_str(user_id) for user_id in post.get("likes", [])]
+
+def user_interests(user) -> list:
+    """
+    Centres d'intérêt de l'utilisateur normalisés (minuscules, sans espaces autour, sans doublons),
+    ce sont les id des noeuds :Interest
+    """
+    interests = (str(interest).strip().lower() for interest in user.get("interests") or [])
+    return list(dict.fromkeys(interest for interest in interests if interest))
+
+def message_sender(private_message) -> list:
+    return [binary_id_to_str(private_message["sender_id"])]
+
+def message_receiver(private_message) -> list:
+    return [binary_id_to_str(private_message["receiver_id"])]
+
+# Pour chaque collection synchronisée: label Neo4j, propriétés du noeud, champs MongoDB lus pour le noeud
+# et relations portées par le document (type -> fonction qui extrait les id liés, champs MongoDB lus)
+COLLECTIONS = {
+    "users": ("Users", partial(node_properties, "Users"), node_fields("Users"),
+              {"FRIENDS": (user_friends, ["friends"]),
+               "MEMBER_OF": (user_groups, ["groups"]),
+               "FOLLOWS": (user_pages, ["pages"])}),
+    "group": ("Group", partial(node_properties, "Group"), node_fields("Group"),
+              {"CREATED_GROUP": (document_creator, ["createdBy._id"])}),
+    "pages": ("Pages", partial(node_properties, "Pages"), node_fields("Pages"),
+              {"CREATED_PAGE": (document_creator, ["createdBy._id"])}),
+    "posts": ("Posts", partial(node_properties, "Posts"), node_fields("Posts"),
+              {"POSTED": (post_author, ["userId"]),
+               "LIKES": (post_likes, ["likes"])}),
+    "privates_messages": ("PrivateMessage", partial(node_properties, "PrivateMessage"), node_fields("PrivateMessage"),
+                          {"SEND_MESSAGE": (message_sender, ["sender_id"]),
+                           "RECEIVE_MESSAGE": (message_receiver, ["receiver_id"])}),
+}
+
+def link_pairs(rel_type: str, document_id: str, other_ids: list) -> list:
+    """
+    Transforme les id liés à un document en paires (id de départ, id d'arrivée) dans le bon sens
+    """
+    if rel_type in OWNED_AT_START:
+        return [(document_id, other_id) for other_id in other_ids]
+    return [(other_id, document_id) for other_id in other_ids]
+
+def owned_relationship_pattern(rel_type: str, owner: str, properties: str = "") -> str:
+    """
+    Motif Cypher des relations rel_type portées par le noeud owner (le document MongoDB qui les contient),
+    la relation est r et l'autre noeud other
+    """
+    start_label, end_label = RELATIONSHIPS[rel_type]
+    if rel_type in OWNED_AT_START:
+        return f"({owner}:{start_label} {properties})-[r:{rel_type}]->(other)"
+    return f"({owner}:{end_label} {properties})<-[r:{rel_type}]-(other)"
+
+def replace_relationships(rel_type: str, links: dict) -> None:
+    """
+    Remplace les relations rel_type des documents modifiés: supprime celles qui ne sont plus
+    dans le document puis crée les nouvelles
+
+    Args:
+        rel_type (str): Le type de la relation
+        links (dict): id du document -> liste des id liés dans le document
+    """
+    query = f"""
+        UNWIND $rows AS row
+        MATCH {owned_relationship_pattern(rel_type, "owner", "{id: row.id}")}
+        WHERE NOT other.id IN row.others
+        WITH r, startNode(r).id AS start_id
+        DELETE r
+        RETURN DISTINCT start_id AS id
+    """
+    for batch in batched(links.items()):
+        deleted = run_query(query, rows=[{"id": id, "others": others} for id, others in batch])
+        if rel_type in RECOMMENDATION_RELATIONSHIPS:
+            record_changed_users(record["id"] for record in deleted)
+    merge_relationships(rel_type, (pair for id, others in links.items()
+                                   for pair in link_pairs(rel_type, id, others)))
+
+def delete_nodes(label: str, ids: list) -> None:
+    """
+    Supprime les noeuds label et leurs relations, par paquets. Les utilisateurs au départ des relations
+    de RECOMMENDATION_RELATIONSHIPS supprimées avec eux (ex: les membres d'un groupe supprimé, les amis
+    d'un utilisateur supprimé) sont enregistrés pour invalider leurs recommandations
+    """
+    query = f"""
+        UNWIND $ids AS id
+        MATCH (n:{label} {{id: id}})
+        OPTIONAL MATCH (user:Users)-[r]->(n)
+        WHERE type(r) IN $rel_types
+        WITH n, collect(DISTINCT user.id) AS users
+        DETACH DELETE n
+        RETURN users
+    """
+    for batch in batched(ids):
+        records = run_query(query, ids=batch, rel_types=sorted(RECOMMENDATION_RELATIONSHIPS))
+        id_cache.discard(label, batch)
+        record_changed_users(user_id for record in records for user_id in record["users"])
+        if label == "Users":
+            record_changed_users(batch)
+
+class NodeStage:
+    """
+    Étape d'un parcours de collection: crée ou met à jour les noeuds des documents
+    """
+
+    def __init__(self, label: str, properties, fields: list):
+        self.label = label
+        self.properties = properties
+        self.fields = fields
+        self.name = f"nodes {label}"
+        self.labels = []
+
+    def process(self, documents: list) -> None:
+        merge_nodes(self.label, [self.properties(document) for document in documents])
+
+    def finish(self) -> None:
+        pass
+
+class LinkStage:
+    """
+    Étape d'un parcours de collection: crée les relations rel_type portées par les documents.
+    Les relations dont un noeud n'existe pas encore (ex: un ami qui sera parcouru plus tard, un groupe
+    pas encore synchronisé) sont mises de côté dans SYNC_STATE_DIR et retentées dans finish(),
+    une fois que toutes les collections ont été parcourues.
+    Le fichier est écrit sur le disque après chaque paquet, avant le checkpoint du parcours, il survit donc
+    à un crash et une synchro reprise continue de le remplir
+    """
+
+    def __init__(self, rel_type: str, extract, fields: list):
+        self.rel_type = rel_type
+        self.extract = extract
+        self.fields = fields
+        self.name = rel_type
+        self.labels = list(RELATIONSHIPS[rel_type])
+        os.makedirs(SYNC_STATE_DIR, exist_ok=True)
+        self.pending = open(os.path.join(SYNC_STATE_DIR, f"{rel_type}.pending"), "a+", encoding="utf-8")
+
+    def process(self, documents: list) -> None:
+        pairs = [pair for document in documents
+                 for pair in link_pairs(self.rel_type, binary_id_to_str(document["_id"]), self.extract(document))]
+        start_label, end_label = RELATIONSHIPS[self.rel_type]
+        existing_starts = id_cache.resolve(start_label, {start for start, _ in pairs})
+        existing_ends = id_cache.resolve(end_label, {end for _, end in pairs})
+
+        ready = []
+        for start, end in pairs:
+            if start in existing_starts and end in existing_ends:
+                ready.append((start, end))
+            else:
+                self.pending.write(f"{start}\t{end}\n")
+        self.pending.flush()
+        os.fsync(self.pending.fileno())
+        merge_relationships(self.rel_type, ready)
+
+    def finish(self) -> None:
+        self.pending.seek(0)
+        # Une ligne coupée par un crash est ignorée, le paquet qui l'a écrite est relu à la reprise
+        pairs = (line.rstrip("\n").split("\t") for line in self.pending)
+        merge_relationships(self.rel_type, (pair for pair in pairs if len(pair) == 2))
+        self.pending.close()
+
+def sync_interests(users: list) -> None:
+    """
+    Crée les noeuds :Interest qui n'existent pas encore et met à jour les relations HAS_INTEREST des utilisateurs.
+    Les centres d'intérêt actuels de chaque utilisateur sont lus dans Neo4j et comparés à ceux du document,
+    seules les relations ajoutées ou retirées sont écrites
+
+    Args:
+        users (list): Les documents des utilisateurs (avec _id et interests), déjà synchronisés en noeuds :Users
+    """
+    interests = {binary_id_to_str(user["_id"]): user_interests(user) for user in users}
+    names = {name for user_names in interests.values() for name in user_names}
+    missing = names - id_cache.resolve("Interest", names)
+    merge_nodes("Interest", [{"id": name, "name": name} for name in sorted(missing)])
+
+    query = """
+        UNWIND $ids AS id
+        MATCH (u:Users {id: id})
+        RETURN u.id AS id, [(u)-[:HAS_INTEREST]->(interest:Interest) | interest.id] AS interests
+    """
+    added = []
+    removed = {}
+    for batch in batched(interests.items()):
+        current = {record["id"]: set(record["interests"])
+                   for record in run_query(query, ids=[user_id for user_id, _ in batch])}
+        for user_id, user_names in batch:
+            existing = current.get(user_id, set())
+            added += [(user_id, name) for name in user_names if name not in existing]
+            stale = existing - set(user_names)
+            if stale:
+                removed[user_id] = sorted(stale)
+    delete_relationships("HAS_INTEREST", removed)
+    merge_relationships("HAS_INTEREST", added)
+
+class InterestStage:
+    """
+    Étape du parcours de la collection users: crée les noeuds :Interest et met à jour les relations HAS_INTEREST
+    (les noeuds :Users du paquet ont déjà été créés par le NodeStage, enregistré avant)
+    """
+
+    def __init__(self):
+        self.fields = ["interests"]
+        self.name = "HAS_INTEREST"
+        self.labels = []
+
+    def process(self, documents: list) -> None:
+        sync_interests(documents)
+
+    def finish(self) -> None:
+        pass
+
+# Étapes appliquées à chaque paquet de documents lors du parcours d'une collection.
+# Chaque collection n'est lue qu'une fois, ajouter un type de relation revient à ajouter une étape
+STAGES = {}
+
+def register_stage(collection: str, factory) -> None:
+    """
+    Ajoute une étape au parcours de la collection
+
+    Args:
+        collection (str): Le nom de la collection MongoDB
+        factory: Fonction sans argument qui crée l'étape (un nouvel objet à chaque synchro).
+                 L'étape doit avoir les attributs name, fields (champs MongoDB lus) et labels
+                 (labels des noeuds dont elle a besoin) et les méthodes process(documents) et finish(),
+                 finish() est appelée une fois que les collections de ces labels ont été parcourues
+    """
+    STAGES.setdefault(collection, []).append(factory)
+
+for collection, (label, properties, fields, links) in COLLECTIONS.items():
+    register_stage(collection, partial(NodeStage, label, properties, fields))
+    for rel_type, (extract, link_fields) in links.items():
+        register_stage(collection, partial(LinkStage, rel_type, extract, link_fields))
+register_stage("users", InterestStage)
+
+class SyncCheckpoint:
+    """
+    Avancement d'une synchro complète, sauvegardé dans SYNC_STATE_DIR/state.json:
+    nom de l'étape -> {"last_id": dernier _id traité, "count": documents traités, "done": étape terminée}
+    """
+
+    def __init__(self, directory: str = None):
+        directory = directory or SYNC_STATE_DIR
+        self.directory = directory
+        self.path = os.path.join(directory, "state.json")
+        # Les étapes exécutées en parallèle sauvegardent le même fichier
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as state_file:
+                self.steps = json_util.loads(state_file.read())
         else:
-            createdBy_id = "None"
-        neo4j_page = Node("Pages",
-                          id=page_id,
-                          name=page["name"],
-                          description=page["description"], 
-                          createdBy=createdBy_id,
-                          createdAt=page["createdAt"])
-        neo4j_graph.merge(neo4j_page, "Pages", "id")
-
-        # Créer la relation "CREATED_PAGES" entre l'utilisateur et son post
-        userId = createdBy_id
-        neo4j_user = matcher.match("Users", id=userId).first()
-        if neo4j_user:
-            neo4j_graph.merge(Relationship(neo4j_user, "CREATED_PAGE", neo4j_page))
-
-    print("Synch pages: terminé")
-
-def sync_posts():
-    """
-    Synchronise la collection posts de MongoDB vers Neo4j et crée les relations entre Users et Posts
-    """
-    for post in db.posts.find():
-        post_id = binary_id_to_str(post["_id"])
-        neo4j_post = Node("Posts",
-                          id=post_id,
-                          content=post["content"],
-                          image=post["image"], 
-                          createdAt=post["createdAt"])
-        neo4j_graph.merge(neo4j_post, "Posts", "id")
-        
-        # Créer la relation "CREATES" entre l'utilisateur et son post
-        userId = binary_id_to_str(post["userId"])
-        neo4j_user = matcher.match("Users", id=userId).first()
-        if neo4j_user:
-            neo4j_graph.merge(Relationship(neo4j_user, "POSTED", neo4j_post))
-        
-    print("Synch posts: terminé")
-
-def sync_privates_messages():
-    """
-    Synchronise la collection privates_messages de MongoDB vers neo4j et créé les relations entre l'émetteur et le récepteur
-    """
-    for privateMessage in db.privates_messages.find():
-        privateMessage_id = binary_id_to_str(privateMessage["_id"])
-        neo4j_privateMessage = Node("PrivateMessage",
-                                    id=privateMessage_id,
-                                    content=privateMessage["content"],
-                                    createdAt=privateMessage["createdAt"]
-                                    )
-        neo4j_graph.merge(neo4j_privateMessage, "PrivateMessage", "id")
-
-        # Créer la relation "SEND_MESSAGE" et "RECEIVE_MESSAGE" entre les deux utilisateurs et le message
-        sender_id = binary_id_to_str(privateMessage["sender_id"])
-        receiver_id = binary_id_to_str(privateMessage["receiver_id"])
-        neo4j_sender = matcher.match("Users", id=sender_id).first()
-        neo4j_receiver = matcher.match("Users", id=receiver_id).first()
-        if neo4j_sender and neo4j_receiver:
-            neo4j_graph.merge(Relationship(neo4j_sender, "SEND_MESSAGE", neo4j_privateMessage))
-            neo4j_graph.merge(Relationship(neo4j_privateMessage, "RECEIVE_MESSAGE", neo4j_receiver))
-        
-    print("Synch private messages: terminé")
-
-def sync_friendships():
-    """
-    Synchronise les relations d'amitié entre les Users de MongoDB vers Neo4j
-    """
-    for user in db.users.find():
-        user_id = binary_id_to_str(user["_id"])
-        neo4j_user = matcher.match("Users", id=user_id).first()
-        if neo4j_user:
-            for friend_id in user.get("friends", []):
-                friend = matcher.match("Users", id=friend_id).first()
-                if friend:
-                    neo4j_graph.merge(Relationship(neo4j_user, "FRIENDS", friend))
-        
-    print("Synch FRIENDS: terminé")
-
-def sync_memberships():
-    """
-    Synchronise les relations de membre entre users et group de MongoDB vers neo4j
-    """
-    for user in db.users.find():
-        user_id = binary_id_to_str(user["_id"])
-        neo4j_user = matcher.match("Users", id=user_id).first()
-        if neo4j_user:
-            for group_id in user.get("groups", []):
-                group = matcher.match("Group", id=group_id).first()
-                if group:
-                    neo4j_graph.merge(Relationship(neo4j_user, "MEMBER_OF", group))
-        
-    print("Synch MEMBER_OF: terminé")
-
-def sync_page_follows():
-    """
-    Synchronise les relations de suivi entre users et pages de MongoDB vers Neo4j
-    """
-    for user in db.users.find():
-        user_id = binary_id_to_str(user["_id"])
-        neo4j_user = matcher.match("Users", id=user_id).first()
-        if neo4j_user:
-            user_pages = user.get("pages")
-            if len(user_pages) > 0:
-                for page_id in user_pages:
-                    page_id = binary_id_to_str(page_id)
-                    print(page_id)
-                    page = matcher.match("Pages", id=page_id).first()
-                    if page:
-                        neo4j_graph.merge(Relationship(neo4j_user, "FOLLOWS", page))
-        
-    print("Synch FOLLOWS: terminé")
-
-def sync_likes():
-    """
-    Synchronise les relations j'aime entre Users et Posts de MongoDB vers Neo4j
-    """
-    for post in db.posts.find():
-        post_id = binary_id_to_str(post["_id"])
-        neo4j_post = matcher.match("Posts", id=post_id).first()
-        if neo4j_post:
-            for user_id in post.get("likes", []):
-                neo4j_user = matcher.match("Users", id=user_id).first()
-                if neo4j_user:
-                    neo4j_graph.merge(Relationship(neo4j_user, "LIKES", neo4j_post))
-        
-    print("Synch LIKES: terminé")
-
-def full_synchronization():
+            # Sans checkpoint, les relations mises de côté qui restent viennent de paquets qui seront relus
+            shutil.rmtree(directory, ignore_errors=True)
+            self.steps = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, step: str) -> dict:
+        with self.lock:
+            return dict(self.steps.get(step, {}))
+
+    def save(self, step: str, **values) -> None:
+        """
+        Met à jour l'avancement de l'étape et réécrit le fichier (fichier temporaire, fsync puis renommage,
+        le checkpoint est soit l'ancien soit le nouveau même en cas de crash)
+        """
+        with self.lock:
+            self.steps.setdefault(step, {}).update(values)
+            temporary_file = self.path + ".tmp"
+            with open(temporary_file, 'w', encoding='utf-8') as state_file:
+                state_file.write(json_util.dumps(self.steps))
+                state_file.flush()
+                os.fsync(state_file.fileno())
+            os.replace(temporary_file, self.path)
+
+    def run(self, step: str, function) -> None:
+        """
+        Exécute function() sauf si l'étape est déjà terminée dans le checkpoint
+        """
+        if self.get(step).get("done"):
+            return
+        function()
+        self.save(step, done=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def after_id(last_id) -> dict:
+    """
+    Filtre des documents qui suivent last_id dans le tri par _id croissant de MongoDB: les _id du même type
+    plus grands que last_id et tous les _id des types triés après (ex: les ObjectId après un Binary).
+    Chaque condition du $or utilise l'index de _id
+
+    Retourne:
+        dict: Le filtre MongoDB, vide (tout reparcourir) si le type de last_id n'est pas connu
+    """
+    # bool est une sous-classe de int, il est testé en premier
+    position = next((position for position, (_, python_types) in reversed(list(enumerate(ID_TYPE_ORDER)))
+                     if isinstance(last_id, python_types)), None)
+    if position is None:
+        return {}
+    later_types = [bson_type for bson_types, _ in ID_TYPE_ORDER[position + 1:] for bson_type in bson_types]
+    return {"$or": [{"_id": {"$gt": last_id}}] + [{"_id": {"$type": bson_type}} for bson_type in later_types]}
+
+def scan_collection(collection: str, stages: list, batch_size: int = BATCH_SIZE,
+                    checkpoint: SyncCheckpoint = None) -> int:
+    """
+    Lit une seule fois la collection par _id croissant, en ne récupérant que les champs utilisés par les étapes,
+    et passe chaque paquet de documents à toutes les étapes.
+    Avec un checkpoint, le dernier _id traité est sauvegardé après chaque paquet et le parcours reprend
+    après ce _id, types de _id suivants compris (voir after_id). Les étapes sont idempotentes,
+    un paquet interrompu peut être retraité
+
+    Retourne:
+        int: Le nombre de documents parcourus
+    """
+    step = f"scan {collection}"
+    state = checkpoint.get(step) if checkpoint else {}
+    if state.get("done"):
+        print(f"Synch {collection}: déjà terminé ({state['count']} documents)")
+        return state["count"]
+
+    query = after_id(state["last_id"]) if "last_id" in state else {}
+    if query:
+        print(f"Synch {collection}: reprise après {state['count']} documents")
+    elif "last_id" in state:
+        print(f"Synch {collection}: type de _id inconnu, reprise depuis le début")
+    projection = {field: 1 for stage in stages for field in stage.fields}
+    cursor = db[collection].find(query, projection).sort("_id", 1).batch_size(batch_size)
+    batches = batched(cursor, batch_size)
+    count = state.get("count", 0) if query else 0
+    while True:
+        with mongo_fetch_seconds.time(collection=collection):
+            documents = next(batches, None)
+        if documents is None:
+            break
+        for stage in stages:
+            stage.process(documents)
+        count += len(documents)
+        sync_documents.inc(len(documents), collection=collection)
+        if checkpoint:
+            checkpoint.save(step, last_id=documents[-1]["_id"], count=count)
+    if checkpoint:
+        checkpoint.save(step, count=count, done=True)
+    print(f"Synch {collection}: terminé ({count} documents)")
+    return count
+
+def run_steps(steps: dict, workers: int = SYNC_WORKERS) -> dict:
+    """
+    Exécute des étapes en parallèle en respectant leurs dépendances (graphe orienté sans cycle),
+    une étape est lancée dès que toutes ses dépendances sont terminées
+
+    Args:
+        steps (dict): nom de l'étape -> (fonction sans argument, liste des noms des étapes dont elle dépend)
+        workers (int): Le nombre d'étapes exécutées en même temps
+
+    Retourne:
+        dict: nom de l'étape -> (début, fin) en secondes depuis le lancement
+    """
+    for name, (_, dependencies) in steps.items():
+        for dependency in dependencies:
+            if dependency not in steps:
+                raise ValueError(f"L'étape {name} dépend de l'étape inconnue {dependency}")
+
+    run_start = time.perf_counter()
+
+    def timed(name, function):
+        start = time.perf_counter() - run_start
+        function()
+        end = time.perf_counter() - run_start
+        sync_step_seconds.set(end - start, step=name)
+        return start, end
+
+    timings = {}
+    remaining = dict(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while remaining or running:
+            for name, (function, dependencies) in list(remaining.items()):
+                if all(dependency in timings for dependency in dependencies):
+                    running[executor.submit(timed, name, function)] = name
+                    del remaining[name]
+            if not running:
+                raise ValueError(f"Dépendances circulaires entre les étapes {', '.join(remaining)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                # result() relance l'exception de l'étape, le with attend la fin des étapes en cours
+                timings[running.pop(future)] = future.result()
+    return timings
+
+def print_timings(steps: dict, timings: dict) -> None:
+    """
+    Affiche la durée de chaque étape et le chemin critique (la chaîne de dépendances qui a fixé la durée totale)
+    """
+    for name, (start, end) in sorted(timings.items(), key=lambda item: item[1]):
+        print(f"  {name}: {end - start:.2f}s (de {start:.2f}s à {end:.2f}s)")
+
+    critical_path = []
+    name = max(timings, key=lambda step: timings[step][1])
+    while name:
+        critical_path.append(name)
+        dependencies = steps[name][1]
+        name = max(dependencies, key=lambda step: timings[step][1]) if dependencies else None
+    print(f"Chemin critique: {' -> '.join(reversed(critical_path))}")
+
+# Fichiers verrous ouverts par ce process: chemin -> fichier (le verrou flock est lié au fichier ouvert)
+sync_locks = {}
+
+def acquire_sync_lock(path: str = None) -> bool:
+    """
+    Prend le verrou exclusif (flock) du fichier SYNC_LOCK_FILE et y écrit le pid du process.
+    Le système libère le verrou quand le fichier est fermé ou que le process s'arrête:
+    un verrou abandonné n'a jamais besoin d'être supprimé
+
+    Retourne:
+        bool: False si une synchro ou une réconciliation est déjà en cours (dans ce process ou un autre)
+    """
+    path = path or SYNC_LOCK_FILE
+    lock_file = open(path, 'a+', encoding='utf-8')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    sync_locks[path] = lock_file
+    return True
+
+def release_sync_lock(path: str = None) -> None:
+    # Le fichier n'est pas supprimé: un autre process a pu l'ouvrir et attendre le verrou
+    lock_file = sync_locks.pop(path or SYNC_LOCK_FILE, None)
+    if lock_file:
+        lock_file.truncate(0)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+def full_synchronization() -> bool:
     """
     Fonction qui regroupe toute les synchronisations de la bdd MongoDB vers la bdd neo4j
+
+    Fonctionnement:
+        - Chaque collection est parcourue une fois par une étape "scan", les scans n'ont pas de dépendances
+          car les relations dont un noeud manque encore sont mises de côté par les LinkStage
+        - L'étape "finish" d'une relation attend uniquement les scans des collections de ses deux noeuds
+        - Les étapes indépendantes sont exécutées en parallèle sur SYNC_WORKERS threads
+        - L'avancement est sauvegardé dans SYNC_STATE_DIR après chaque paquet et chaque étape: si la synchro
+          s'arrête (crash, erreur Neo4j...), la suivante reprend au dernier checkpoint au lieu de tout refaire
+        - SYNC_LOCK_FILE empêche de lancer une synchro pendant qu'une autre synchro ou une réconciliation tourne
+
+    Retourne:
+        bool: False si la synchro n'a pas été lancée car le verrou est déjà pris
     """
-    sync_users()
-    sync_groups()
-    sync_pages()
-    sync_posts()
-    sync_privates_messages()
-    sync_friendships()
-    sync_memberships()
-    sync_page_follows()
-    sync_likes()
-    
-    print("Synchro middleware: terminé")
-
-#full_synchronization()
-
-# Planification de la synchronisation quotidienne à minuit
-schedule.every().day.at("00:00").do(full_synchronization)
-
-# Boucle pour vérifier s'il est l'heure de faire la synchro
-while True:
-    print("En attente de la prochaine synchronisation...")
-    schedule.run_pending()
-    time.sleep(120)
\ No newline at end of file
+    if not acquire_sync_lock():
+        print("Synchro middleware: une synchro est déjà en cours, annulée")
+        return False
+    try:
+        checkpoint = SyncCheckpoint()
+        if checkpoint.steps:
+            print(f"Synchro middleware: reprise du checkpoint ({len(checkpoint.steps)} étapes commencées)")
+        create_constraints()
+        label_collections = {label: collection for collection, (label, _, _, _) in COLLECTIONS.items()}
+
+        steps = {}
+        for collection, factories in STAGES.items():
+            stages = [factory() for factory in factories]
+            steps[f"scan {collection}"] = (partial(scan_collection, collection, stages, checkpoint=checkpoint), [])
+            for stage in stages:
+                dependencies = {f"scan {collection}"} | {f"scan {label_collections[label]}" for label in stage.labels}
+                steps[f"finish {stage.name}"] = (partial(checkpoint.run, f"finish {stage.name}", stage.finish),
+                                                 sorted(dependencies))
+
+        timings = run_steps(steps)
+        print_timings(steps, timings)
+        notify_recommendations()
+        checkpoint.clear()
+        print("Synchro middleware: terminé")
+        return True
+    finally:
+        release_sync_lock()
+
+def run_safely(job) -> None:
+    """
+    Exécute une tâche planifiée en affichant son erreur au lieu de laisser l'exception arrêter
+    la boucle de planification (une synchro interrompue reprend à son checkpoint la fois suivante)
+    """
+    try:
+        job()
+    except Exception:
+        print(f"Erreur pendant {job.__name__}:")
+        traceback.print_exc()
+
+class IdSet:
+    """
+    Ensemble des id des noeuds écrits dans les fichiers d'import en masse. Les id hexadécimaux
+    (UUID MongoDB) sont gardés sur 16 octets au lieu de 32 caractères
+    """
+
+    def __init__(self):
+        self.ids = set()
+
+    @staticmethod
+    def key(node_id: str):
+        if len(node_id) == 32:
+            try:
+                return bytes.fromhex(node_id)
+            except ValueError:
+                pass
+        return node_id
+
+    def add(self, node_id: str) -> bool:
+        """
+        Ajoute l'id, retourne False s'il était déjà dans l'ensemble
+        """
+        key = self.key(node_id)
+        if key in self.ids:
+            return False
+        self.ids.add(key)
+        return True
+
+    def __contains__(self, node_id: str) -> bool:
+        return self.key(node_id) in self.ids
+
+def bulk_type(value) -> str:
+    """
+    Type neo4j-admin d'une propriété, None pour une chaîne de caractères
+    """
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, datetime):
+        return "datetime" if value.tzinfo else "localdatetime"
+    if isinstance(value, list):
+        return "string[]"
+    return None
+
+def bulk_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return BULK_ARRAY_DELIMITER.join(str(element) for element in value)
+    return value
+
+def write_bulk_nodes(collection: str, directory: str, id_sets: dict) -> int:
+    """
+    Parcourt une fois la collection et écrit ses noeuds dans <Label>.csv, et les relations qu'elle porte
+    dans <TYPE>.pending.csv (filtrées ensuite par write_bulk_relationships).
+    Le type des propriétés est déduit du premier document, tous les documents doivent avoir les mêmes types
+
+    Retourne:
+        int: Le nombre de noeuds écrits
+    """
+    label, properties, fields, links = COLLECTIONS[collection]
+    projection = {field: 1 for field in fields}
+    projection.update((field, 1) for _, link_fields in links.values() for field in link_fields)
+    cursor = db[collection].find({}, projection).batch_size(BATCH_SIZE)
+
+    relationship_files = {rel_type: open(os.path.join(directory, f"{rel_type}.pending.csv"), "w",
+                                         newline="", encoding="utf-8") for rel_type in links}
+    relationship_writers = {rel_type: csv.writer(file) for rel_type, file in relationship_files.items()}
+    header = None
+    count = 0
+    duplicates = 0
+    try:
+        with open(os.path.join(directory, f"{label}.csv"), "w", newline="", encoding="utf-8") as nodes_file:
+            writer = csv.writer(nodes_file)
+            for document in cursor:
+                row = properties(document)
+                if header is None:
+                    header = [f"id:ID({label})" if key == "id" else
+                              f"{key}:{bulk_type(value)}" if bulk_type(value) else key
+                              for key, value in row.items()]
+                if not id_sets[label].add(row["id"]):
+                    duplicates += 1
+                    continue
+                writer.writerow([bulk_value(value) for value in row.values()])
+                count += 1
+
+                for rel_type, (extract, _) in links.items():
+                    # Un même id peut apparaître plusieurs fois dans une liste, MERGE n'aurait créé qu'une relation
+                    others = dict.fromkeys(extract(document))
+                    relationship_writers[rel_type].writerows(link_pairs(rel_type, row["id"], others))
+    finally:
+        for file in relationship_files.values():
+            file.close()
+
+    with open(os.path.join(directory, f"{label}.header.csv"), "w", newline="", encoding="utf-8") as header_file:
+        csv.writer(header_file).writerow(header or [f"id:ID({label})"])
+    print(f"Import en masse {label}: {count} noeuds ({duplicates} doublons ignorés)")
+    return count
+
+def write_bulk_relationships(rel_type: str, directory: str, id_sets: dict) -> int:
+    """
+    Écrit dans <TYPE>.csv les relations de <TYPE>.pending.csv dont les deux noeuds existent
+    (neo4j-admin refuse les relations vers des noeuds absents des fichiers)
+
+    Retourne:
+        int: Le nombre de relations écrites
+    """
+    start_label, end_label = RELATIONSHIPS[rel_type]
+    pending = os.path.join(directory, f"{rel_type}.pending.csv")
+    count = 0
+    skipped = 0
+    with open(pending, "r", newline="", encoding="utf-8") as pending_file, \
+            open(os.path.join(directory, f"{rel_type}.csv"), "w", newline="", encoding="utf-8") as relationships_file:
+        writer = csv.writer(relationships_file)
+        for start, end in csv.reader(pending_file):
+            if start in id_sets[start_label] and end in id_sets[end_label]:
+                writer.writerow((start, end))
+                count += 1
+            else:
+                skipped += 1
+    os.remove(pending)
+
+    with open(os.path.join(directory, f"{rel_type}.header.csv"), "w", newline="", encoding="utf-8") as header_file:
+        csv.writer(header_file).writerow([f":START_ID({start_label})", f":END_ID({end_label})"])
+    print(f"Import en masse {rel_type}: {count} relations ({skipped} vers des noeuds absents ignorées)")
+    return count
+
+def write_bulk_interests(directory: str, id_sets: dict) -> int:
+    """
+    Parcourt les centres d'intérêt des utilisateurs et écrit les noeuds :Interest dans Interest.csv
+    (une fois par centre d'intérêt grâce à id_sets["Interest"]) et les relations dans HAS_INTEREST.csv.
+    Les deux noeuds de chaque relation sont connus, elles n'ont pas besoin d'être filtrées
+
+    Retourne:
+        int: Le nombre de relations écrites
+    """
+    users = IdSet()
+    interests = 0
+    count = 0
+    cursor = db["users"].find({}, {"interests": 1}).batch_size(BATCH_SIZE)
+    with open(os.path.join(directory, "Interest.csv"), "w", newline="", encoding="utf-8") as nodes_file, \
+            open(os.path.join(directory, "HAS_INTEREST.csv"), "w", newline="", encoding="utf-8") as relationships_file:
+        nodes_writer = csv.writer(nodes_file)
+        relationships_writer = csv.writer(relationships_file)
+        for user in cursor:
+            user_id = binary_id_to_str(user["_id"])
+            # Les doublons de _id ne sont écrits qu'une fois, comme par write_bulk_nodes
+            if not users.add(user_id):
+                continue
+            for name in user_interests(user):
+                if id_sets["Interest"].add(name):
+                    nodes_writer.writerow((name, name))
+                    interests += 1
+                relationships_writer.writerow((user_id, name))
+                count += 1
+
+    with open(os.path.join(directory, "Interest.header.csv"), "w", newline="", encoding="utf-8") as header_file:
+        csv.writer(header_file).writerow(["id:ID(Interest)", "name"])
+    with open(os.path.join(directory, "HAS_INTEREST.header.csv"), "w", newline="", encoding="utf-8") as header_file:
+        csv.writer(header_file).writerow([":START_ID(Users)", ":END_ID(Interest)"])
+    print(f"Import en masse Interest: {interests} noeuds, {count} relations HAS_INTEREST")
+    return count
+
+def export_bulk_import(directory: str = BULK_IMPORT_DIR) -> None:
+    """
+    Démarrage à froid: écrit tous les noeuds et relations dans des fichiers CSV au format de
+    neo4j-admin database import, beaucoup plus rapide qu'une synchro complète avec MERGE sur une base vide
+
+    Fonctionnement:
+        - Chaque collection est lue une seule fois, les noeuds sont écrits directement
+          et les relations mises de côté dans un fichier
+        - Les id des noeuds écrits sont gardés en mémoire (IdSet) pour ignorer les doublons
+          et les relations vers des noeuds qui n'existent pas
+        - Les noeuds :Interest et les relations HAS_INTEREST sont écrits à partir des centres d'intérêt
+          des utilisateurs (write_bulk_interests)
+        - Les étapes indépendantes sont exécutées en parallèle comme pour full_synchronization()
+    """
+    os.makedirs(directory, exist_ok=True)
+    id_sets = {label: IdSet() for label in NODE_LABELS}
+    label_collections = {label: collection for collection, (label, _, _, _) in COLLECTIONS.items()}
+
+    steps = {}
+    for collection, (_, _, _, links) in COLLECTIONS.items():
+        steps[f"scan {collection}"] = (partial(write_bulk_nodes, collection, directory, id_sets), [])
+        for rel_type in links:
+            dependencies = {f"scan {collection}"} | {f"scan {label_collections[label]}"
+                                                     for label in RELATIONSHIPS[rel_type]}
+            steps[f"relationships {rel_type}"] = (partial(write_bulk_relationships, rel_type, directory, id_sets),
+                                                  sorted(dependencies))
+    steps["scan interests"] = (partial(write_bulk_interests, directory, id_sets), [])
+
+    timings = run_steps(steps)
+    print_timings(steps, timings)
+
+    arguments = [f"--nodes={label}={directory}/{label}.header.csv,{directory}/{label}.csv"
+                 for label in list(label_collections) + ["Interest"]]
+    arguments += [f"--relationships={rel_type}={directory}/{rel_type}.header.csv,{directory}/{rel_type}.csv"
+                  for rel_type in [rel_type for _, _, _, links in COLLECTIONS.values() for rel_type in links]
+                  + ["HAS_INTEREST"]]
+    print("Import en masse: terminé, à importer dans une base vide (Neo4j arrêté) avec:")
+    print(f"neo4j-admin database import full --array-delimiter=\"{BULK_ARRAY_DELIMITER}\" --multiline-fields=true "
+          f"{' '.join(arguments)} neo4j")
+    print("puis créer les contraintes d'unicité avec create_constraints()")
+
+def apply_changes(changes: list) -> None:
+    """
+    Applique un paquet de changements MongoDB sur Neo4j
+
+    Args:
+        changes (list): Liste de tuples (collection, opération, document), l'opération est
+                        "upsert" (insertion, modification, remplacement) ou "delete"
+                        (le document ne contient alors que son _id)
+
+    Fonctionnement:
+        - Crée ou met à jour les noeuds de toutes les collections
+        - Remplace les relations portées par les documents modifiés et les centres d'intérêt des utilisateurs
+        - Supprime les noeuds des documents supprimés
+    """
+    # On ne garde que la dernière opération de chaque document du paquet: un document supprimé puis réinséré
+    # est seulement mis à jour, un document modifié puis supprimé est seulement supprimé
+    upserts = {collection: {} for collection in COLLECTIONS}
+    deletes = {collection: {} for collection in COLLECTIONS}
+    for collection, operation, document in changes:
+        sync_documents.inc(collection=collection)
+        document_id = binary_id_to_str(document["_id"])
+        if operation == "delete":
+            upserts[collection].pop(document_id, None)
+            deletes[collection][document_id] = True
+        else:
+            deletes[collection].pop(document_id, None)
+            upserts[collection][document_id] = document
+
+    for collection, (label, properties, _, _) in COLLECTIONS.items():
+        merge_nodes(label, [properties(document) for document in upserts[collection].values()])
+
+    for collection, (_, _, _, links) in COLLECTIONS.items():
+        for rel_type, (extract, _) in links.items():
+            document_links = {document_id: extract(document) for document_id, document in upserts[collection].items()}
+            if document_links:
+                replace_relationships(rel_type, document_links)
+    sync_interests(list(upserts["users"].values()))
+
+    for collection, (label, _, _, _) in COLLECTIONS.items():
+        delete_nodes(label, list(deletes[collection]))
+
+    notify_recommendations()
+
+def load_cdc_state() -> dict:
+    if not os.path.exists(CDC_STATE_FILE):
+        return {}
+    with open(CDC_STATE_FILE, 'r', encoding='utf-8') as state_file:
+        return json_util.loads(state_file.read())
+
+def save_cdc_state(state: dict) -> None:
+    """
+    Sauvegarde l'état de la synchro incrémentale, on écrit dans un fichier temporaire
+    puis on le renomme pour ne jamais laisser un fichier à moitié écrit en cas de crash
+    """
+    temporary_file = CDC_STATE_FILE + ".tmp"
+    with open(temporary_file, 'w', encoding='utf-8') as state_file:
+        state_file.write(json_util.dumps(state))
+    os.replace(temporary_file, CDC_STATE_FILE)
+
+def watch_changes(batch_size: int = BATCH_SIZE, max_wait: float = CDC_MAX_WAIT) -> None:
+    """
+    Synchronisation incrémentale en continu à partir des change streams MongoDB (nécessite un replica set).
+    Les changements sont appliqués par paquets et le resume token est sauvegardé après chaque paquet,
+    un redémarrage reprend donc là où la synchro s'était arrêtée.
+
+    Args:
+        batch_size (int): Le nombre maximum de changements par paquet
+        max_wait (float): Le temps maximum (en secondes) avant d'appliquer un paquet incomplet
+    """
+    state = load_cdc_state()
+    pipeline = [{"$match": {"ns.coll": {"$in": list(COLLECTIONS)},
+                            "operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    with db.watch(pipeline, full_document="updateLookup", resume_after=state.get("resume_token"),
+                  max_await_time_ms=int(max_wait * 1000)) as stream:
+        print("Synchro incrémentale: en écoute des changements...")
+        changes = []
+        deadline = time.monotonic() + max_wait
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                collection = change["ns"]["coll"]
+                if change["operationType"] == "delete":
+                    changes.append((collection, "delete", change["documentKey"]))
+                # fullDocument est vide si le document a été supprimé juste après sa modification
+                elif change.get("fullDocument") is not None:
+                    changes.append((collection, "upsert", change["fullDocument"]))
+
+            if len(changes) >= batch_size or time.monotonic() >= deadline:
+                if changes:
+                    apply_changes(changes)
+                    print(f"Synchro incrémentale: {len(changes)} changements appliqués")
+                    changes = []
+                state["resume_token"] = stream.resume_token
+                save_cdc_state(state)
+                deadline = time.monotonic() + max_wait
+
+def poll_changes(interval: float = 60, batch_size: int = BATCH_SIZE) -> None:
+    """
+    Synchronisation incrémentale par polling pour les MongoDB sans replica set (pas de change streams).
+    Pour chaque collection on récupère les documents dont le champ de POLL_WATERMARK_FIELDS est supérieur ou égal
+    au dernier high-water mark sauvegardé: un document écrit plus tard avec la même valeur n'est pas manqué,
+    les id déjà appliqués à cette valeur exacte sont sauvegardés avec le high-water mark et ignorés.
+    Les suppressions ne sont pas détectées dans ce mode, ni les modifications avec le createdAt par défaut.
+    Un avertissement est affiché pour chaque collection dont aucun document n'a le champ.
+
+    Args:
+        interval (float): Le temps (en secondes) entre deux vérifications
+        batch_size (int): Le nombre de documents appliqués par paquet
+    """
+    for collection, field in POLL_WATERMARK_FIELDS.items():
+        if db[collection].find_one({}, {"_id": 1}) is not None \
+                and db[collection].find_one({field: {"$exists": True}}, {"_id": 1}) is None:
+            print(f"Attention: aucun document de {collection} n'a le champ {field}, le polling ne synchronisera "
+                  f"rien pour cette collection (voir POLL_WATERMARK_FIELDS)")
+
+    state = load_cdc_state()
+    watermarks = state.setdefault("watermarks", {})
+    # collection -> id des documents déjà appliqués dont le champ vaut exactement le high-water mark
+    watermark_ids = state.setdefault("watermark_ids", {})
+    while True:
+        for collection, field in POLL_WATERMARK_FIELDS.items():
+            query = {field: {"$exists": True}}
+            if collection in watermarks:
+                query = {field: {"$gte": watermarks[collection]}}
+            cursor = db[collection].find(query).sort([(field, 1), ("_id", 1)]).batch_size(batch_size)
+            for documents in batched(cursor, batch_size):
+                watermark = watermarks.get(collection)
+                applied = set(watermark_ids.get(collection, []))
+                changes = [(collection, "upsert", document) for document in documents
+                           if document[field] != watermark or binary_id_to_str(document["_id"]) not in applied]
+                if changes:
+                    apply_changes(changes)
+
+                last_value = documents[-1][field]
+                if last_value != watermark:
+                    applied = set()
+                applied.update(binary_id_to_str(document["_id"]) for document in documents
+                               if document[field] == last_value)
+                watermarks[collection] = last_value
+                watermark_ids[collection] = sorted(applied)
+                save_cdc_state(state)
+                if changes:
+                    print(f"Synchro incrémentale {collection}: {len(changes)} documents appliqués")
+        time.sleep(interval)
+
+def mongo_id_partitions(collection: str) -> list:
+    """
+    Découpe les _id de la collection en partitions dans lesquelles l'ordre de MongoDB est celui des id
+    convertis en texte (binary_id_to_str): une partition par taille et sous-type des Binary (MongoDB les trie
+    par taille, puis sous-type, puis octets, chaque partition est donc une plage de _id), les ObjectId et les textes.
+    Les tailles et sous-types sont trouvés avec une requête par partition sur l'index de _id
+
+    Retourne:
+        list: Les filtres MongoDB des partitions
+    """
+    partitions = []
+    query = {"_id": {"$type": "binData"}}
+    while True:
+        first = next(iter(db[collection].find(query, {"_id": 1}).sort("_id", 1).limit(1)), None)
+        if first is None:
+            break
+        size, subtype = len(first["_id"]), getattr(first["_id"], "subtype", 0)
+        last = Binary(b"\xff" * size, subtype)
+        partitions.append({"_id": {"$gte": Binary(b"\x00" * size, subtype), "$lte": last}})
+        query = {"_id": {"$type": "binData", "$gt": last}}
+    return partitions + [{"_id": {"$type": "objectId"}}, {"_id": {"$type": "string"}}]
+
+def sorted_mongo_documents(collection: str, fields: list, batch_size: int = BATCH_SIZE):
+    """
+    Parcourt les documents de la collection triés par id converti comme dans Neo4j.
+    Chaque partition de mongo_id_partitions est lue triée par _id puis les partitions sont fusionnées,
+    les _id des autres types (nombres, dates...), rares, sont triés en mémoire
+
+    Retourne:
+        Générateur de tuples (id, document)
+    """
+    projection = {field: 1 for field in fields}
+
+    def read(query):
+        cursor = db[collection].find(query, projection).sort("_id", 1).batch_size(batch_size)
+        return ((binary_id_to_str(document["_id"]), document) for document in cursor)
+
+    others = sorted(read({"$nor": [{"_id": {"$type": bson_type}} for bson_type in ("binData", "objectId", "string")]}),
+                    key=itemgetter(0))
+    previous = None
+    for document_id, document in heapq.merge(*map(read, mongo_id_partitions(collection)), others, key=itemgetter(0)):
+        # Un ordre faux ferait supprimer par reconcile des noeuds dont le document existe
+        if previous is not None and document_id < previous:
+            raise ValueError(f"Les _id de {collection} ne sont pas triés comme leurs id Neo4j "
+                             f"({previous} puis {document_id})")
+        previous = document_id
+        yield document_id, document
+
+def sorted_neo4j_nodes(label: str, rel_types: list, batch_size: int = BATCH_SIZE):
+    """
+    Parcourt les noeuds label triés par id (avec l'index de la contrainte d'unicité), par pages,
+    avec les id des noeuds liés par chaque relation de rel_types qu'ils portent
+
+    Retourne:
+        Générateur de tuples (id, {type de relation: liste des id liés})
+    """
+    links = "".join(f", [{owned_relationship_pattern(rel_type, 'n')} | other.id] AS {rel_type}"
+                    for rel_type in rel_types)
+    query = f"""
+        MATCH (n:{label}) WHERE n.id > $last_id
+        WITH n ORDER BY n.id LIMIT $batch_size
+        RETURN n.id AS id{links}
+        ORDER BY id
+    """
+    last_id = ""
+    while True:
+        records = run_query(query, last_id=last_id, batch_size=batch_size)
+        if not records:
+            return
+        for record in records:
+            yield record["id"], {rel_type: record[rel_type] for rel_type in rel_types}
+        last_id = records[-1]["id"]
+
+def merge_join(left, right):
+    """
+    Parcourt en même temps deux itérables de tuples (clé, valeur) triés par clé, sans les charger en mémoire
+
+    Retourne:
+        Générateur de tuples (clé, valeur de gauche ou None, valeur de droite ou None)
+    """
+    left, right = iter(left), iter(right)
+    left_item, right_item = next(left, None), next(right, None)
+    while left_item is not None or right_item is not None:
+        if right_item is None or (left_item is not None and left_item[0] < right_item[0]):
+            yield left_item[0], left_item[1], None
+            left_item = next(left, None)
+        elif left_item is None or right_item[0] < left_item[0]:
+            yield right_item[0], None, right_item[1]
+            right_item = next(right, None)
+        else:
+            yield left_item[0], left_item[1], right_item[1]
+            left_item, right_item = next(left, None), next(right, None)
+
+def delete_relationships(rel_type: str, stale: dict) -> int:
+    """
+    Supprime des relations rel_type précises, par paquets
+
+    Args:
+        rel_type (str): Le type de la relation
+        stale (dict): id du noeud qui porte la relation -> id des noeuds liés à délier
+
+    Retourne:
+        int: Le nombre de relations supprimées
+    """
+    query = f"""
+        UNWIND $rows AS row
+        MATCH {owned_relationship_pattern(rel_type, "owner", "{id: row.id}")}
+        WHERE other.id IN row.stale
+        WITH r, startNode(r).id AS start_id
+        DELETE r
+        RETURN start_id AS id
+    """
+    count = 0
+    for batch in batched(stale.items()):
+        deleted = run_query(query, rows=[{"id": id, "stale": others} for id, others in batch])
+        count += len(deleted)
+        if rel_type in RECOMMENDATION_RELATIONSHIPS:
+            record_changed_users(record["id"] for record in deleted)
+    return count
+
+def reconcile(batch_size: int = BATCH_SIZE) -> None:
+    """
+    Supprime de Neo4j ce qui n'existe plus dans MongoDB: les noeuds des documents supprimés
+    et les relations retirées des documents (amis, groupes, pages, likes...)
+
+    Fonctionnement:
+        - Pour chaque collection, les documents MongoDB et les noeuds Neo4j sont parcourus en même temps,
+          triés par id (merge join), avec les id liés par chaque relation que porte le document
+        - Un noeud sans document est supprimé avec ses relations
+        - Une relation dont l'id lié n'est plus dans le document est supprimée, les autres ne sont pas touchées
+        - Les suppressions sont envoyées par paquets de batch_size
+        - Elle prend le verrou SYNC_LOCK_FILE, comme la synchro complète, pour ne pas tourner en même temps qu'elle
+    """
+    if not acquire_sync_lock():
+        print("Réconciliation: une synchro est en cours, annulée")
+        return
+    try:
+        for collection, (label, _, _, links) in COLLECTIONS.items():
+            fields = [field for _, link_fields in links.values() for field in link_fields]
+            stale_nodes = []
+            stale_links = {rel_type: {} for rel_type in links}
+            deleted_nodes = 0
+            deleted_links = 0
+
+            for node_id, document, linked in merge_join(sorted_mongo_documents(collection, fields, batch_size),
+                                                        sorted_neo4j_nodes(label, list(links), batch_size)):
+                if linked is None:
+                    # Document pas encore synchronisé
+                    continue
+                if document is None:
+                    stale_nodes.append(node_id)
+                else:
+                    for rel_type, (extract, _) in links.items():
+                        stale = set(linked[rel_type]) - set(extract(document))
+                        if stale:
+                            stale_links[rel_type][node_id] = list(stale)
+
+                if len(stale_nodes) >= batch_size:
+                    delete_nodes(label, stale_nodes)
+                    deleted_nodes += len(stale_nodes)
+                    stale_nodes = []
+                for rel_type, stale in stale_links.items():
+                    if len(stale) >= batch_size:
+                        deleted_links += delete_relationships(rel_type, stale)
+                        stale.clear()
+
+            delete_nodes(label, stale_nodes)
+            deleted_nodes += len(stale_nodes)
+            for rel_type, stale in stale_links.items():
+                deleted_links += delete_relationships(rel_type, stale)
+            print(f"Réconciliation {collection}: {deleted_nodes} noeuds et {deleted_links} relations supprimés")
+
+        notify_recommendations()
+        print("Réconciliation: terminé")
+    finally:
+        release_sync_lock()
+
+# Parcours mesuré par store_report: les groupes des amis d'un utilisateur, comme les recommandations de groupes
+TRAVERSAL_QUERY = """
+    MATCH (u:Users {id: $id})-[:FRIENDS]->(:Users)-[:MEMBER_OF]->(g:Group)
+    RETURN g.name AS name, count(*) AS friends
+"""
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def store_report(sample_size: int = 200) -> dict:
+    """
+    Mesures pour comparer le store avant et après strip_properties: nombre de propriétés par label,
+    taille du store sur disque (si NEO4J_STORE_DIR est défini) et latence de TRAVERSAL_QUERY
+    sur un échantillon d'utilisateurs (mesurée après un premier passage qui remplit le page cache)
+    """
+    report = {"properties": {}, "store_bytes": directory_size(NEO4J_STORE_DIR) if NEO4J_STORE_DIR else None}
+    for label in NODE_LABELS:
+        record = run_query(f"MATCH (n:{label}) RETURN sum(size(keys(n))) AS properties")[0]
+        report["properties"][label] = record["properties"] or 0
+
+    user_ids = [record["id"] for record in run_query("MATCH (u:Users) RETURN u.id AS id LIMIT $limit",
+                                                     limit=sample_size)]
+    for user_id in user_ids:
+        run_query(TRAVERSAL_QUERY, id=user_id)
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        run_query(TRAVERSAL_QUERY, id=user_id)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    for rank in (50, 99):
+        report[f"traversal_p{rank}_ms"] = latencies[min(len(latencies) - 1, len(latencies) * rank // 100)] * 1000 \
+            if latencies else None
+    return report
+
+def print_store_report(before: dict, after: dict) -> None:
+    print(f"{'':<28}{'avant':>14}{'après':>14}")
+    for label in NODE_LABELS:
+        print(f"{'propriétés ' + label:<28}{before['properties'][label]:>14}{after['properties'][label]:>14}")
+    for key, name in (("store_bytes", "store (octets)"), ("traversal_p50_ms", "parcours p50 (ms)"),
+                      ("traversal_p99_ms", "parcours p99 (ms)")):
+        values = [report[key] for report in (before, after)]
+        print(f"{name:<28}" + "".join(f"{value:>14.2f}" if isinstance(value, float) else f"{str(value):>14}"
+                                        for value in values))
+
+def strip_properties(batch_size: int = BATCH_SIZE) -> None:
+    """
+    Migration: supprime des noeuds existants les propriétés qui ne sont plus dans projected_properties
+    (mots de passe, mails, contenus... copiés par les anciennes versions de la synchro), et affiche
+    le rapport de store_report avant et après
+
+    Fonctionnement:
+        - Les noeuds de chaque label sont parcourus par id croissant, par paquets de batch_size,
+          chaque paquet est une transaction
+        - Les propriétés d'un noeud qui en a en trop sont remplacées par la projection (SET n = n {.id, ...})
+        - Neo4j réutilise la place libérée mais les fichiers du store ne rétrécissent qu'après
+          neo4j-admin database copy
+    """
+    before = store_report()
+    for label in NODE_LABELS:
+        keep = projected_properties(label)
+        projection = ", ".join(f".{name}" for name in keep)
+        query = f"""
+            MATCH (n:{label}) WHERE n.id > $last_id
+            WITH n ORDER BY n.id LIMIT $batch_size
+            WITH n, any(key IN keys(n) WHERE NOT key IN $keep) AS bulky
+            FOREACH (_ IN CASE WHEN bulky THEN [1] ELSE [] END | SET n = n {{{projection}}})
+            RETURN max(n.id) AS last_id, count(n) AS nodes, sum(CASE WHEN bulky THEN 1 ELSE 0 END) AS stripped
+        """
+        last_id = ""
+        stripped = 0
+        while True:
+            record = run_query(query, last_id=last_id, batch_size=batch_size, keep=keep)[0]
+            stripped += record["stripped"]
+            if record["nodes"] < batch_size:
+                break
+            last_id = record["last_id"]
+        print(f"Allègement {label}: {stripped} noeuds modifiés (propriétés gardées: {', '.join(keep)})")
+
+    print_store_report(before, store_report())
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "daily"
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+
+    if mode == "watch":
+        watch_changes()
+    elif mode == "poll":
+        poll_changes()
+    elif mode == "bulk":
+        export_bulk_import()
+    elif mode == "reconcile":
+        reconcile()
+    elif mode == "strip":
+        strip_properties()
+    elif mode == "sync":
+        # Synchro complète immédiate, reprend le checkpoint d'une synchro interrompue s'il y en a un
+        full_synchronization()
+    else:
+        # Planification des synchronisations complètes (à minuit par défaut)
+        for sync_time in FULL_SYNC_TIMES:
+            schedule.every().day.at(sync_time).do(run_safely, full_synchronization)
+        # Suppression de ce qui a été supprimé dans MongoDB, après la synchro
+        schedule.every().day.at("03:00").do(run_safely, reconcile)
+
+        # Boucle pour vérifier s'il est l'heure de faire la synchro
+        while True:
+            print("En attente de la prochaine synchronisation...")
+            schedule.run_pending()
+            time.sleep(120)
@@ -1,10 +1,224 @@
-from flask import Flask, jsonify
+import json
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import partial
+from flask import Flask, Response, g, jsonify, request
 from py2neo import Graph
 
+from recommandations_cache import LRUBackend, RedisBackend, RecommendationCache
+from recommandations_graph import GraphProjection
+
+import metrics
+
 MAX_RECOMMANDATIONS = 5  # On limite à 5 recommandations
 
+# Durée de vie (en secondes) des recommandations en cache pour chaque catégorie
+CACHE_TTLS = {
+    "by_common_friends": 300,
+    "by_common_interests": 3600,
+    "groups": 600,
+    "pages": 600,
+}
+CACHE_SIZE = 100_000  # Nombre maximum d'entrées dans le cache en mémoire
+# Redis partagé entre les workers (ex: "redis://localhost:6379/0"), sinon cache en mémoire du process
+REDIS_URL = None
+
+# Mode de calcul des recommandations: "combined" (une seule requête pour les quatre catégories)
+# ou "concurrent" (une requête par catégorie, exécutées en parallèle avec un timeout chacune)
+# ou "memory" (calcul sans requête Neo4j sur une copie en mémoire des relations, nécessite numpy)
+SERVING_MODE = "combined"
+QUERY_WORKERS = 16  # Nombre de threads qui exécutent les requêtes des catégories en mode concurrent
+POOL_SIZE = 8  # Nombre maximum de requêtes Neo4j en cours en même temps dans le process
+POOL_ACQUIRE_TIMEOUT = 2.0  # Attente maximum (en secondes) pour obtenir une connexion du pool
+QUERY_TIMEOUT = 1.0  # Temps maximum (en secondes) pour une catégorie avant de répondre sans elle et d'arrêter sa requête
+
+class PoolTimeout(Exception):
+    pass
+
+class SessionPool:
+    """
+    Limite le nombre de requêtes Neo4j exécutées en même temps (py2neo donne une connexion
+    de son pool à chaque requête en cours) et mesure l'attente pour obtenir une place
+    """
+
+    def __init__(self, graph: Graph, size: int, acquire_timeout: float):
+        self.graph = graph
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def session(self):
+        with self.lock:
+            self.waiting += 1
+        start = time.perf_counter()
+        acquired = self.slots.acquire(timeout=self.acquire_timeout)
+        wait = time.perf_counter() - start
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timeouts += 1
+            else:
+                self.in_flight += 1
+                self.acquisitions += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+        if not acquired:
+            raise PoolTimeout(f"Aucune connexion Neo4j disponible après {self.acquire_timeout}s")
+        try:
+            yield self.graph
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": self.size,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "acquisitions": self.acquisitions,
+                "acquire_timeouts": self.timeouts,
+                "average_wait_ms": self.total_wait / self.acquisitions * 1000 if self.acquisitions else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+# Parcours des amis d'amis: "exact", "bounded" (échantillonné et plafonné) ou "auto"
+# (bounded seulement pour les utilisateurs qui ont plus de SUPERNODE_DEGREE amis)
+TRAVERSAL_MODE = "auto"
+SUPERNODE_DEGREE = 1000
+# Durée (en secondes) pendant laquelle le choix exact/bounded d'un utilisateur est gardé en mémoire
+TRAVERSAL_DECISION_TTL = 3600
+FIRST_HOP_LIMIT = 100  # Nombre moyen d'amis échantillonnés en mode bounded
+SECOND_HOP_LIMIT = 100  # Nombre maximum de voisins parcourus par ami échantillonné
+# Au plus FIRST_HOP_LIMIT * SECOND_HOP_LIMIT chemins sont parcourus, en plus de ce budget en temps
+QUERY_TIME_BUDGET = 0.5  # Temps maximum (en secondes) d'une requête bounded avant qu'elle soit arrêtée
+
+BATCH_QUERY_SIZE = 100  # Nombre d'utilisateurs calculés par requête groupée
+BATCH_MAX_USERS = 10_000  # Nombre maximum d'utilisateurs dans un appel à /recommendations/batch
+PRECOMPUTED_DB = "recommendations.sqlite"  # Stockage des recommandations précalculées
+PRECOMPUTED_MAX_AGE = 24 * 3600  # Âge maximum (en secondes) d'une recommandation précalculée
+# Mode "memory": nombre d'utilisateurs mis à jour avant de recharger toute la projection,
+# et intervalle (en secondes) entre deux rechargements complets
+PROJECTION_REBUILD_THRESHOLD = 100_000
+PROJECTION_RELOAD_INTERVAL = 6 * 3600
+
+# Métriques exposées sur /metrics
+request_seconds = metrics.Histogram("recommendation_request_seconds", "Durée des requêtes HTTP", ("endpoint",))
+query_seconds = metrics.Histogram("recommendation_query_seconds",
+                                  "Durée du calcul des recommandations par catégorie (ou combined, bounded, memory)",
+                                  ("category",))
+precomputed_requests = metrics.Counter("recommendation_precomputed_requests_total",
+                                       "Lectures des recommandations précalculées (result: hit ou miss)", ("result",))
+pool_stats_gauge = metrics.Gauge("neo4j_pool", "État du pool de connexions Neo4j", ("stat",))
+
 app = Flask(__name__)
+store_connections = threading.local()
 graph = Graph("bolt://localhost:7687", auth=("neo4j", "rootroot"))
+pool = SessionPool(graph, POOL_SIZE, POOL_ACQUIRE_TIMEOUT)
+executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS)
+cache = RecommendationCache(RedisBackend(REDIS_URL) if REDIS_URL else LRUBackend(CACHE_SIZE), CACHE_TTLS)
+# id utilisateur -> True si ses amis d'amis sont parcourus en mode bounded (TRAVERSAL_MODE "auto")
+traversal_decisions = LRUBackend(CACHE_SIZE)
+projection = None
+if SERVING_MODE == "memory":
+    projection = GraphProjection(graph, PROJECTION_REBUILD_THRESHOLD)
+    projection.load()
+    projection.reload_every(PROJECTION_RELOAD_INTERVAL)
+
+# Temps maximum des requêtes Neo4j du thread courant (voir query_budget), None sans limite
+query_budgets = threading.local()
+
+@contextmanager
+def query_budget(seconds: float):
+    """
+    Arrête dans Neo4j les requêtes lancées par le thread courant dans ce bloc après seconds secondes
+    (elles lèvent alors QueryBudgetExceeded)
+    """
+    previous = getattr(query_budgets, "seconds", None)
+    query_budgets.seconds = seconds
+    try:
+        yield
+    finally:
+        query_budgets.seconds = previous
+
+def run_query(query: str, **parameters) -> list:
+    """
+    Exécute une requête Cypher avec une connexion du pool, avec le temps maximum de query_budget s'il y en a un
+
+    Retourne:
+        list: Les lignes du résultat sous forme de dictionnaires
+    """
+    if getattr(query_budgets, "seconds", None) is not None:
+        return run_with_budget(query, query_budgets.seconds, **parameters)
+    with pool.session() as session:
+        return metrics.run_cypher(session, query, **parameters)
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def terminate_query(marker: str) -> None:
+    """
+    Arrête côté Neo4j la transaction dont la requête contient le marqueur. Les commandes passent directement
+    par graph et pas par le pool: quand le pool est plein, c'est justement qu'il faut arrêter des requêtes
+    """
+    transaction_ids = [record["transactionId"] for record in metrics.run_cypher(
+        graph, "SHOW TRANSACTIONS YIELD transactionId, currentQuery "
+        "WHERE currentQuery CONTAINS $marker RETURN transactionId", marker=marker)]
+    if transaction_ids:
+        metrics.run_cypher(graph, "TERMINATE TRANSACTIONS $transaction_ids", transaction_ids=transaction_ids)
+
+def run_with_budget(query: str, time_budget: float = QUERY_TIME_BUDGET, **parameters) -> list:
+    """
+    Exécute une requête Cypher qui est arrêtée dans Neo4j si elle dure plus de time_budget secondes
+    (ou plus que le query_budget du thread, s'il est plus court). L'attente d'une connexion du pool compte
+    dans le temps. La requête est marquée d'un commentaire unique pour retrouver sa transaction
+
+    Retourne:
+        list: Les lignes du résultat sous forme de dictionnaires
+    """
+    if getattr(query_budgets, "seconds", None) is not None:
+        time_budget = min(time_budget, query_budgets.seconds)
+    deadline = time.monotonic() + time_budget
+    marker = uuid.uuid4().hex
+    # Positionné dès le début du watchdog: l'erreur de la requête arrêtée peut arriver avant
+    # la fin de terminate_query (Timer.finished n'est positionné qu'après)
+    budget_exceeded = threading.Event()
+
+    def stop_query():
+        budget_exceeded.set()
+        try:
+            terminate_query(marker)
+        except Exception as error:
+            print(f"Erreur pendant l'arrêt de la requête {marker}: {error}")
+
+    with pool.session() as session:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise QueryBudgetExceeded(f"Requête pas lancée, budget de {time_budget}s dépassé en attendant le pool")
+        watchdog = threading.Timer(remaining, stop_query)
+        watchdog.start()
+        try:
+            return metrics.run_cypher(session, f"// budget {marker}\n{query}", **parameters)
+        except Exception as error:
+            if budget_exceeded.is_set():
+                raise QueryBudgetExceeded(f"Requête arrêtée après {time_budget}s") from error
+            raise
+        finally:
+            watchdog.cancel()
 
 def get_friend_recommendations_by_common_friends(user_id: str, limit: int = MAX_RECOMMANDATIONS) -> list:
     """
@@ -26,7 +240,7 @@ def get_friend_recommendations_by_common_friends(user_id: str, limit: int = MAX_
         ORDER BY commonFriends DESC
         LIMIT {limit}
     """
-    result = graph.run(query)
+    result = run_query(query)
     return [
         {
             "user_id": record["recommended_user"],
@@ -47,7 +261,7 @@ def get_friend_recommendations_by_common_interests(user_id: str, limit: int = MA
         list: Liste de dictionnaires contenant les informations des amis recommandés (id utilisateur, nombre d'intérêts en commun)
     """
     query = f"""
-        MATCH (u:Users {{id: "{user_id}"}})-[:HAS_INTEREST]->(interest)<-[:HAS_INTEREST]-(recommended)
+        MATCH (u:Users {{id: "{user_id}"}})-[:HAS_INTEREST]->(interest:Interest)<-[:HAS_INTEREST]-(recommended)
         WHERE NOT (u)-[:FRIENDS]->(recommended) AND u <> recommended
         WITH recommended, COUNT(interest) AS commonInterests
         RETURN recommended.id AS recommended_user,
@@ -55,7 +269,7 @@ def get_friend_recommendations_by_common_interests(user_id: str, limit: int = MA
         ORDER BY commonInterests DESC
         LIMIT {limit}
     """
-    result = graph.run(query)
+    result = run_query(query)
     return [
         {
             "user_id": record["recommended_user"],
@@ -84,7 +298,7 @@ def get_group_recommendations(user_id: str, limit: int = MAX_RECOMMANDATIONS) ->
         ORDER BY friends_in_group DESC
         LIMIT {limit}
     """
-    result = graph.run(query)
+    result = run_query(query)
     return [
         {
             "group_id": record["group_id"],
@@ -114,7 +328,7 @@ def get_page_recommendations(user_id: str, limit: int = MAX_RECOMMANDATIONS) ->
         ORDER BY friends_following_page DESC
         LIMIT {limit}
     """
-    result = graph.run(query)
+    result = run_query(query)
     return [
         {
             "page_id": record["page_id"],
@@ -124,40 +338,561 @@ def get_page_recommendations(user_id: str, limit: int = MAX_RECOMMANDATIONS) ->
         for record in result
     ]
 
-@app.route('/recommendations/<user_id>', methods=['GET'])
-def recommend(user_id: str):
+def get_friend_recommendations_by_common_friends_bounded(user_id: str, limit: int = MAX_RECOMMANDATIONS,
+                                                        first_hop: int = FIRST_HOP_LIMIT,
+                                                        second_hop: int = SECOND_HOP_LIMIT) -> list:
     """
-    Lien de l'API pour récupérer toute les recommandations d'un utilisateur
+    Version à coût borné de get_friend_recommendations_by_common_friends pour les utilisateurs avec beaucoup d'amis.
+    On échantillonne environ first_hop amis et on parcourt au plus second_hop amis de chacun.
+    Chaque chemin est pondéré par l'inverse de sa probabilité d'être parcouru (degré de l'ami / voisins parcourus,
+    nombre d'amis / amis échantillonnés), le nombre d'amis en commun retourné est donc une estimation
 
     Args:
         user_id (str): L'id de l'utilisateur pour lequel on veut les recommandations
+        limit (int): Le nombre maximum de recommandations à retourner
+        first_hop (int): Le nombre moyen d'amis échantillonnés
+        second_hop (int): Le nombre maximum d'amis parcourus pour chaque ami échantillonné
 
     Retourne:
-        Response: Objet JSON qui contient les recommandations organisées par amis (en communs, centre d'intérêts), groupes et pages
+        list: Liste de dictionnaires contenant les informations des amis recommandés (id utilisateur, nombre d'amis en commun estimé)
+    Lève:
+        QueryBudgetExceeded: Si la requête a dépassé QUERY_TIME_BUDGET (le résultat ne doit pas être mis en cache)
+    """
+    query = """
+        MATCH (u:Users {id: $user_id})-[:FRIENDS]->(friend:Users)
+        WITH u, collect(friend) AS friends
+        WITH u, size(friends) AS degree,
+             [friend IN friends WHERE rand() < toFloat($first_hop) / size(friends)] AS sampled
+        WHERE size(sampled) > 0
+        UNWIND sampled AS friend
+        WITH u, friend, toFloat(degree) / size(sampled) AS first_hop_weight,
+             COUNT { (friend)-[:FRIENDS]->() } AS friend_degree
+        CALL {
+            WITH friend
+            MATCH (friend)-[:FRIENDS]->(recommended)
+            RETURN recommended
+            LIMIT $second_hop
+        }
+        WITH u, recommended, first_hop_weight * friend_degree /
+             CASE WHEN friend_degree < $second_hop THEN friend_degree ELSE $second_hop END AS weight
+        WHERE NOT (u)-[:FRIENDS]->(recommended) AND u <> recommended
+        WITH recommended, sum(weight) AS commonFriends
+        RETURN recommended.id AS recommended_user,
+               toInteger(round(commonFriends)) AS commonFriends
+        ORDER BY commonFriends DESC
+        LIMIT $limit
+    """
+    result = run_with_budget(query, user_id=user_id, limit=limit, first_hop=first_hop, second_hop=second_hop)
+    return [
+        {
+            "user_id": record["recommended_user"],
+            "common_friends": record["commonFriends"]
+        }
+        for record in result
+    ]
+
+def get_group_recommendations_bounded(user_id: str, limit: int = MAX_RECOMMANDATIONS,
+                                      first_hop: int = FIRST_HOP_LIMIT,
+                                      second_hop: int = SECOND_HOP_LIMIT) -> list:
+    """
+    Version à coût borné de get_group_recommendations, avec le même échantillonnage des amis que
+    get_friend_recommendations_by_common_friends_bounded. Le nombre d'amis dans le groupe est une estimation
+
+    Args:
+        user_id (str): L'id de l'utilisateur pour lequel on veut les recommandations
+        limit (int): Le nombre maximum de recommandations à retourner
+        first_hop (int): Le nombre moyen d'amis échantillonnés
+        second_hop (int): Le nombre maximum de groupes parcourus pour chaque ami échantillonné
+
+    Retourne:
+        list: Liste de dictionnaires contenant les informations des groupes recommandés (id du groupe, nom, nombre d'amis dans le groupe estimé)
+    Lève:
+        QueryBudgetExceeded: Si la requête a dépassé QUERY_TIME_BUDGET (le résultat ne doit pas être mis en cache)
+    """
+    query = """
+        MATCH (u:Users {id: $user_id})-[:FRIENDS]->(friend:Users)
+        WITH u, collect(friend) AS friends
+        WITH u, size(friends) AS degree,
+             [friend IN friends WHERE rand() < toFloat($first_hop) / size(friends)] AS sampled
+        WHERE size(sampled) > 0
+        UNWIND sampled AS friend
+        WITH u, friend, toFloat(degree) / size(sampled) AS weight
+        CALL {
+            WITH friend
+            MATCH (friend)-[:MEMBER_OF]->(group:Group)
+            RETURN group
+            LIMIT $second_hop
+        }
+        WITH u, group, weight
+        WHERE NOT (u)-[:MEMBER_OF]->(group)
+        WITH group, sum(weight) AS friends_in_group
+        RETURN group.id AS group_id,
+               group.name AS group_name,
+               toInteger(round(friends_in_group)) AS friends_in_group
+        ORDER BY friends_in_group DESC
+        LIMIT $limit
+    """
+    result = run_with_budget(query, user_id=user_id, limit=limit, first_hop=first_hop, second_hop=second_hop)
+    return [
+        {
+            "group_id": record["group_id"],
+            "group_name": record["group_name"],
+            "friends_in_group": record["friends_in_group"]
+        }
+        for record in result
+    ]
+
+def use_bounded_traversal(user_id: str) -> bool:
+    """
+    Indique si les amis d'amis de l'utilisateur doivent être parcourus en mode bounded selon TRAVERSAL_MODE.
+    En mode "auto", le choix est gardé TRAVERSAL_DECISION_TTL secondes: le nombre d'amis n'est demandé à Neo4j
+    qu'une fois par utilisateur
+    """
+    if TRAVERSAL_MODE != "auto":
+        return TRAVERSAL_MODE == "bounded"
+    bounded = traversal_decisions.get(user_id)
+    if bounded is None:
+        record = run_query("MATCH (u:Users {id: $user_id}) RETURN COUNT { (u)-[:FRIENDS]->() } AS degree",
+                           user_id=user_id)
+        bounded = bool(record) and record[0]["degree"] > SUPERNODE_DEGREE
+        traversal_decisions.set(user_id, bounded, TRAVERSAL_DECISION_TTL)
+    return bounded
+
+def get_batch_recommendations(user_ids: list, limit: int = MAX_RECOMMANDATIONS, max_degree: int = None) -> dict:
+    """
+    Calcule les quatre catégories de recommandations de plusieurs utilisateurs en un seul aller-retour avec Neo4j.
+    Chaque utilisateur et ses amis ne sont cherchés qu'une fois, puis chaque catégorie est calculée
+    dans un sous-requête CALL qui réutilise la liste des amis
+
+    Args:
+        user_ids (list): Les id des utilisateurs pour lesquels on veut les recommandations
+        limit (int): Le nombre maximum de recommandations par catégorie
+        max_degree (int): Les utilisateurs qui ont plus de max_degree amis ne sont pas calculés (aucune limite par défaut)
+
+    Retourne:
+        dict: id utilisateur -> recommandations par catégorie (by_common_friends, by_common_interests, groups, pages),
+              dans le même format que les fonctions de chaque catégorie. Les utilisateurs inconnus sont absents,
+              ceux qui ont plus de max_degree amis ont la valeur None (à calculer avec les parcours bornés)
+    """
+    query = """
+        UNWIND $user_ids AS user_id
+        MATCH (u:Users {id: user_id})
+        WITH u, $max_degree IS NOT NULL AND COUNT { (u)-[:FRIENDS]->() } > $max_degree AS supernode
+        OPTIONAL MATCH (u)-[:FRIENDS]->(friend:Users)
+        WHERE NOT supernode
+        WITH u, supernode, collect(DISTINCT friend) AS friends
+        CALL {
+            WITH u, friends
+            UNWIND friends AS friend
+            MATCH (friend)-[:FRIENDS]->(recommended)
+            WHERE NOT recommended IN friends AND u <> recommended
+            WITH recommended, COUNT(friend) AS commonFriends
+            ORDER BY commonFriends DESC
+            LIMIT $limit
+            RETURN collect({user_id: recommended.id, common_friends: commonFriends}) AS by_common_friends
+        }
+        CALL {
+            WITH u, supernode, friends
+            MATCH (u)-[:HAS_INTEREST]->(interest:Interest)<-[:HAS_INTEREST]-(recommended)
+            WHERE NOT supernode AND NOT recommended IN friends AND u <> recommended
+            WITH recommended, COUNT(interest) AS commonInterests
+            ORDER BY commonInterests DESC
+            LIMIT $limit
+            RETURN collect({user_id: recommended.id, common_interests: commonInterests}) AS by_common_interests
+        }
+        CALL {
+            WITH u, friends
+            UNWIND friends AS friend
+            MATCH (friend)-[:MEMBER_OF]->(group:Group)
+            WHERE NOT (u)-[:MEMBER_OF]->(group)
+            WITH group, COUNT(friend) AS friends_in_group
+            ORDER BY friends_in_group DESC
+            LIMIT $limit
+            RETURN collect({group_id: group.id, group_name: group.name,
+                            friends_in_group: friends_in_group}) AS groups
+        }
+        CALL {
+            WITH u, friends
+            UNWIND friends AS friend
+            MATCH (friend)-[:FOLLOWS]->(page:Pages)
+            WHERE NOT (u)-[:FOLLOWS]->(page)
+            WITH page, COUNT(friend) AS friends_following_page
+            ORDER BY friends_following_page DESC
+            LIMIT $limit
+            RETURN collect({page_id: page.id, page_name: page.name,
+                            friends_following_page: friends_following_page}) AS pages
+        }
+        RETURN u.id AS user_id, supernode, by_common_friends, by_common_interests, groups, pages
+    """
+    return {record.pop("user_id"): None if record.pop("supernode") else record
+            for record in run_query(query, user_ids=user_ids, limit=limit, max_degree=max_degree)}
+
+def get_all_recommendations(user_id: str, limit: int = MAX_RECOMMANDATIONS) -> dict:
+    """
+    Calcule les quatre catégories de recommandations d'un utilisateur en un seul aller-retour avec Neo4j
+
+    Retourne:
+        dict: Les recommandations par catégorie (by_common_friends, by_common_interests, groups, pages)
     """
-    friends_by_common_friends = get_friend_recommendations_by_common_friends(user_id)
-    friends_by_common_interests = get_friend_recommendations_by_common_interests(user_id)
-    group_recommendations = get_group_recommendations(user_id)
-    page_recommendations = get_page_recommendations(user_id)
+    return get_batch_recommendations([user_id], limit).get(user_id, empty_recommendations())
 
-    response = {
+def empty_recommendations() -> dict:
+    return {category: [] for category in CACHE_TTLS}
+
+def precomputed_store():
+    """
+    Connexion SQLite du thread courant vers le stockage des recommandations précalculées
+    (une connexion SQLite ne peut pas être partagée entre les threads de Flask)
+    """
+    if not hasattr(store_connections, "connection"):
+        connection = sqlite3.connect(PRECOMPUTED_DB)
+        connection.execute("CREATE TABLE IF NOT EXISTS recommendations "
+                           "(user_id TEXT PRIMARY KEY, recommendations TEXT, computed_at REAL)")
+        store_connections.connection = connection
+    return store_connections.connection
+
+def load_precomputed(user_ids: list) -> dict:
+    """
+    Récupère les recommandations précalculées des utilisateurs, plus récentes que PRECOMPUTED_MAX_AGE
+
+    Retourne:
+        dict: id utilisateur -> recommandations par catégorie, les utilisateurs sans résultat récent sont absents
+    """
+    recommendations = {}
+    # Par paquets pour rester sous la limite de paramètres de SQLite
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        rows = precomputed_store().execute(
+            f"SELECT user_id, recommendations FROM recommendations "
+            f"WHERE computed_at > ? AND user_id IN ({', '.join('?' * len(batch))})",
+            [time.time() - PRECOMPUTED_MAX_AGE, *batch])
+        recommendations.update((user_id, json.loads(values)) for user_id, values in rows)
+    return recommendations
+
+def save_precomputed(recommendations: dict) -> None:
+    connection = precomputed_store()
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO recommendations VALUES (?, ?, ?)",
+                               [(user_id, json.dumps(values), time.time())
+                                for user_id, values in recommendations.items()])
+
+def delete_precomputed(user_ids: list) -> None:
+    connection = precomputed_store()
+    with connection:
+        connection.executemany("DELETE FROM recommendations WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+
+def resolve_recommendations(user_ids: list) -> dict:
+    """
+    Récupère les recommandations précalculées et calcule les manquantes avec des requêtes groupées
+    (ou les calcule toutes avec la projection en mémoire en mode "memory")
+
+    Retourne:
+        dict: id utilisateur -> recommandations par catégorie, pour tous les user_ids
+    """
+    if projection is not None:
+        return {user_id: projection.recommend(user_id, MAX_RECOMMANDATIONS) for user_id in user_ids}
+    recommendations = load_precomputed(user_ids)
+    missing = [user_id for user_id in user_ids if user_id not in recommendations]
+    for start in range(0, len(missing), BATCH_QUERY_SIZE):
+        recommendations.update(compute_batch(missing[start:start + BATCH_QUERY_SIZE]))
+    return {user_id: {category: [] if value is None else value
+                      for category, value in recommendations.get(user_id, empty_recommendations()).items()}
+            for user_id in user_ids}
+
+def compute_batch(user_ids: list) -> dict:
+    """
+    Calcule les recommandations de plusieurs utilisateurs avec une requête groupée, sauf ceux qui ont plus de
+    SUPERNODE_DEGREE amis (hors TRAVERSAL_MODE "exact"): un seul d'entre eux bloquerait toute la requête,
+    ils sont calculés ensuite avec les parcours bornés
+
+    Retourne:
+        dict: id utilisateur -> recommandations par catégorie, None pour les catégories arrêtées
+              par QUERY_TIME_BUDGET. Les utilisateurs inconnus sont absents
+    """
+    results = get_batch_recommendations(user_ids, max_degree=None if TRAVERSAL_MODE == "exact" else SUPERNODE_DEGREE)
+    for user_id, recommendations in results.items():
+        if recommendations is None:
+            results[user_id] = compute_bounded_recommendations(user_id)
+    return results
+
+def precompute_all(page_size: int = BATCH_QUERY_SIZE) -> None:
+    """
+    Job hors ligne: parcourt tous les :Users par pages triées par id et enregistre leurs recommandations
+    dans le stockage précalculé, utilisé ensuite en priorité par l'API
+    """
+    last_id = ""
+    count = 0
+    while True:
+        user_ids = [record["id"] for record in run_query(
+            "MATCH (u:Users) WHERE u.id > $last_id RETURN u.id AS id ORDER BY u.id LIMIT $page_size",
+            last_id=last_id, page_size=page_size)]
+        if not user_ids:
+            break
+        recommendations = compute_batch(user_ids)
+        # Les utilisateurs dont une catégorie a été arrêtée par QUERY_TIME_BUDGET seront calculés à la demande
+        save_precomputed({user_id: recommendations.get(user_id, empty_recommendations()) for user_id in user_ids
+                          if None not in recommendations.get(user_id, {}).values()})
+        count += len(user_ids)
+        last_id = user_ids[-1]
+        print(f"Recommandations précalculées: {count} utilisateurs")
+    print("Précalcul des recommandations: terminé")
+
+# Fonction de calcul de chaque catégorie, utilisée en mode concurrent et pour les utilisateurs en mode bounded
+CATEGORY_FUNCTIONS = {
+    "by_common_friends": get_friend_recommendations_by_common_friends,
+    "by_common_interests": get_friend_recommendations_by_common_interests,
+    "groups": get_group_recommendations,
+    "pages": get_page_recommendations,
+}
+BOUNDED_CATEGORY_FUNCTIONS = dict(CATEGORY_FUNCTIONS,
+                                  by_common_friends=get_friend_recommendations_by_common_friends_bounded,
+                                  groups=get_group_recommendations_bounded)
+
+def compute_recommendations(user_id: str) -> dict:
+    """
+    Calcule toutes les catégories de recommandations, avec la requête combinée ou catégorie
+    par catégorie avec les parcours bornés si l'utilisateur a trop d'amis.
+    En mode "auto", la requête combinée compte elle-même les amis (un seul aller-retour avec Neo4j)
+    et ne calcule rien pour un utilisateur qui en a plus de SUPERNODE_DEGREE
+    """
+    auto = TRAVERSAL_MODE == "auto"
+    bounded = traversal_decisions.get(user_id) if auto else TRAVERSAL_MODE == "bounded"
+    if not bounded:
+        with query_seconds.time(category="combined"):
+            results = get_batch_recommendations([user_id], max_degree=SUPERNODE_DEGREE if auto else None)
+        if user_id not in results:
+            return empty_recommendations()
+        if auto:
+            traversal_decisions.set(user_id, results[user_id] is None, TRAVERSAL_DECISION_TTL)
+        if results[user_id] is not None:
+            return results[user_id]
+    return compute_bounded_recommendations(user_id)
+
+def compute_bounded_recommendations(user_id: str) -> dict:
+    """
+    Calcule les catégories une par une avec les parcours bornés
+
+    Retourne:
+        dict: Les recommandations par catégorie, None pour les catégories arrêtées par QUERY_TIME_BUDGET
+              (elles ne sont pas mises en cache et seront recalculées au prochain appel)
+    """
+    recommendations = {}
+    with query_seconds.time(category="bounded"):
+        for category, function in BOUNDED_CATEGORY_FUNCTIONS.items():
+            try:
+                recommendations[category] = function(user_id)
+            except QueryBudgetExceeded as error:
+                print(f"Recommandations {category} de {user_id}: {error}")
+                recommendations[category] = None
+    return recommendations
+
+def category_function(category: str, user_id: str):
+    """
+    Fonction de calcul d'une catégorie pour l'utilisateur. Le choix exact/bounded n'est fait que pour
+    les catégories qui ont un parcours borné, au moment du calcul (donc seulement si le cache n'a pas la valeur)
+    """
+    function = CATEGORY_FUNCTIONS[category]
+    if BOUNDED_CATEGORY_FUNCTIONS[category] is not function and use_bounded_traversal(user_id):
+        return BOUNDED_CATEGORY_FUNCTIONS[category]
+    return function
+
+def get_concurrent_recommendations(user_id: str, timeout: float = QUERY_TIMEOUT) -> tuple:
+    """
+    Calcule les catégories de recommandations en parallèle, chacune avec sa propre requête.
+    Une catégorie qui ne répond pas avant timeout est renvoyée vide et ses requêtes sont arrêtées dans Neo4j
+    (query_budget), elles ne gardent donc pas leur connexion du pool. Rien n'est mis en cache pour cette catégorie
+
+    Args:
+        user_id (str): L'id de l'utilisateur pour lequel on veut les recommandations
+        timeout (float): Le temps maximum (en secondes) pour toutes les catégories
+
+    Retourne:
+        tuple: (recommandations par catégorie, liste des catégories qui n'ont pas répondu à temps)
+    """
+    deadline = time.monotonic() + timeout
+
+    def timed_compute(category: str):
+        with query_budget(max(0.0, deadline - time.monotonic())):
+            function = category_function(category, user_id)
+            with query_seconds.time(category=category):
+                return function(user_id)
+
+    futures = {
+        category: executor.submit(cache.get_or_compute, category, user_id, partial(timed_compute, category))
+        for category in CATEGORY_FUNCTIONS
+    }
+    recommendations = {}
+    timed_out = []
+    for category, future in futures.items():
+        try:
+            recommendations[category] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except (FutureTimeoutError, PoolTimeout, QueryBudgetExceeded):
+            recommendations[category] = []
+            timed_out.append(category)
+    return recommendations, timed_out
+
+def build_response(user_id: str, recommendations: dict) -> dict:
+    """
+    Met en forme les recommandations d'un utilisateur pour la réponse de l'API
+    """
+    return {
         "user_id": user_id,
         "recommended_friends": {
-            "by_common_friends": friends_by_common_friends,
-            "by_common_interests": friends_by_common_interests
+            "by_common_friends": recommendations["by_common_friends"],
+            "by_common_interests": recommendations["by_common_interests"]
         },
         "recommended_groups": {
-            "count": len(group_recommendations),
-            "details": group_recommendations
+            "count": len(recommendations["groups"]),
+            "details": recommendations["groups"]
         },
         "recommended_pages": {
-            "count": len(page_recommendations),
-            "details": page_recommendations
+            "count": len(recommendations["pages"]),
+            "details": recommendations["pages"]
         }
     }
-    
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_duration(response):
+    if hasattr(g, "request_start"):
+        request_seconds.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or "unknown")
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Lien de l'API pour Prometheus: latences des requêtes et des calculs, taux de hit du cache et du précalcul,
+    requêtes Neo4j et état du pool
+    """
+    for stat, value in pool.stats().items():
+        pool_stats_gauge.set(value, stat=stat)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/recommendations/<user_id>', methods=['GET'])
+def recommend(user_id: str):
+    """
+    Lien de l'API pour récupérer toute les recommandations d'un utilisateur
+
+    Args:
+        user_id (str): L'id de l'utilisateur pour lequel on veut les recommandations
+
+    Retourne:
+        Response: Objet JSON qui contient les recommandations organisées par amis (en communs, centre d'intérêts), groupes et pages
+    """
+    if projection is not None:
+        with query_seconds.time(category="memory"):
+            recommendations = projection.recommend(user_id, MAX_RECOMMANDATIONS)
+        return jsonify(build_response(user_id, recommendations))
+
+    precomputed = load_precomputed([user_id])
+    precomputed_requests.inc(result="hit" if user_id in precomputed else "miss")
+    if user_id in precomputed:
+        return jsonify(build_response(user_id, precomputed[user_id]))
+
+    if SERVING_MODE == "concurrent":
+        recommendations, timed_out = get_concurrent_recommendations(user_id)
+        response = build_response(user_id, recommendations)
+        if timed_out:
+            response["timed_out"] = timed_out
+        return jsonify(response)
+
+    recommendations = cache.get_or_compute_all(user_id, lambda: compute_recommendations(user_id))
+    # Catégories arrêtées par QUERY_TIME_BUDGET: renvoyées vides, comme en mode concurrent
+    timed_out = [category for category, value in recommendations.items() if value is None]
+    response = build_response(user_id, {category: [] if value is None else value
+                                        for category, value in recommendations.items()})
+    if timed_out:
+        response["timed_out"] = timed_out
     return jsonify(response)
 
-# Lancer le serveur Flask
+def request_body():
+    """
+    Corps JSON d'une requête POST qui porte des id d'utilisateurs
+
+    Retourne:
+        dict: Le corps (avec user_ids, [] par défaut), ou None si ce n'est pas un objet JSON dont user_ids
+              est une liste de textes (et categories, s'il est présent, une liste de textes)
+    """
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict):
+        return None
+    body.setdefault("user_ids", [])
+    for key in ("user_ids", "categories"):
+        values = body.get(key, [])
+        if values is not None and (not isinstance(values, list) or not all(isinstance(value, str) for value in values)):
+            return None
+    return body
+
+def invalid_body():
+    return jsonify({"error": 'Le corps doit être un objet JSON {"user_ids": [...]} avec des id en texte'}), 400
+
+@app.route('/recommendations/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Lien de l'API pour récupérer les recommandations de plusieurs utilisateurs en un appel
+    (utilisé par les jobs du fil d'actualité et des mails)
+
+    Corps de la requête:
+        JSON {"user_ids": [...]}, au plus BATCH_MAX_USERS id
+
+    Retourne:
+        Response: Objet JSON {"results": [...]} avec une réponse par utilisateur, dans le format de /recommendations/<user_id>
+    """
+    body = request_body()
+    if body is None:
+        return invalid_body()
+    user_ids = list(dict.fromkeys(body["user_ids"]))
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({"error": f"Maximum {BATCH_MAX_USERS} utilisateurs par appel"}), 400
+
+    recommendations = resolve_recommendations(user_ids)
+    return jsonify({"results": [build_response(user_id, recommendations[user_id]) for user_id in user_ids]})
+
+@app.route('/recommendations/pool', methods=['GET'])
+def pool_stats():
+    """
+    Lien de l'API pour surveiller le pool de connexions Neo4j (taille, requêtes en cours, attente)
+    """
+    return jsonify(pool.stats())
+
+def log_refresh_error(future) -> None:
+    """
+    Affiche l'erreur d'une mise à jour de la projection lancée en arrière-plan, son résultat n'étant jamais attendu
+    """
+    error = future.exception()
+    if error is not None:
+        print(f"Erreur pendant la mise à jour de la projection: {error}")
+
+@app.route('/recommendations/invalidate', methods=['POST'])
+def invalidate():
+    """
+    Lien de l'API appelé par le middleware de synchronisation pour supprimer du cache
+    les recommandations des utilisateurs dont les relations ont changé
+
+    Corps de la requête:
+        JSON {"user_ids": [...], "categories": [...]}, categories est optionnel (toutes par défaut)
+
+    Retourne:
+        Response: Objet JSON avec le nombre d'utilisateurs invalidés
+    """
+    body = request_body()
+    if body is None:
+        return invalid_body()
+    user_ids = body["user_ids"]
+    cache.invalidate(user_ids, body.get("categories"))
+    traversal_decisions.delete(user_ids)
+    delete_precomputed(user_ids)
+    if projection is not None:
+        # La projection relit les relations dans Neo4j, sans faire attendre le middleware
+        executor.submit(projection.refresh, user_ids).add_done_callback(log_refresh_error)
+    return jsonify({"invalidated": len(user_ids)})
+
+# Lancer le serveur Flask, ou le précalcul avec: python recommandations.py precompute
 if __name__ == '__main__':
-    app.run(port=5001, debug=True)
+    if len(sys.argv) > 1 and sys.argv[1] == "precompute":
+        precompute_all()
+    else:
+        app.run(port=5001, debug=True)
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+cache_requests = metrics.Counter("recommendation_cache_requests_total",
+                                 "Lectures du cache des recommandations (result: hit ou miss)", ("category", "result"))
+
+class LRUBackend:
+    """
+    Stockage en mémoire du process, les entrées les moins récemment utilisées sont supprimées
+    quand on dépasse max_size
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float) -> None:
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys: list) -> None:
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+class RedisBackend:
+    """
+    Stockage partagé entre tous les workers du serveur, les valeurs sont enregistrées en JSON
+    et Redis gère lui-même l'expiration
+    """
+
+    def __init__(self, url: str, prefix: str = "recommendations:"):
+        if redis is None:
+            raise ImportError("Le module redis est nécessaire pour utiliser RedisBackend (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, keys: list) -> None:
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+class RecommendationCache:
+    """
+    Cache des recommandations par catégorie et par utilisateur, devant les requêtes Neo4j.
+    Si plusieurs requêtes demandent en même temps une recommandation absente du cache,
+    une seule la calcule et les autres attendent son résultat (protection contre le "cache stampede").
+    """
+
+    def __init__(self, backend, ttls: dict):
+        """
+        Args:
+            backend: LRUBackend ou RedisBackend (ou tout objet avec get, set et delete)
+            ttls (dict): Durée de vie en secondes des recommandations de chaque catégorie
+        """
+        self.backend = backend
+        self.ttls = ttls
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def _single_flight(self, key: str, compute):
+        """
+        Exécute compute() une seule fois pour key même si plusieurs threads le demandent en même temps,
+        les autres threads attendent et récupèrent le même résultat
+        """
+        with self.lock:
+            future = self.in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self.in_flight[key] = Future()
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = compute()
+            future.set_result(value)
+            return value
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def get_or_compute(self, category: str, user_id: str, compute):
+        """
+        Retourne la recommandation en cache, ou la calcule avec compute() et la met en cache
+
+        Args:
+            category (str): La catégorie de recommandation, clé de ttls
+            user_id (str): L'id de l'utilisateur
+            compute: Fonction sans argument qui calcule la recommandation
+        """
+        key = f"{category}:{user_id}"
+        value = self.backend.get(key)
+        cache_requests.inc(category=category, result="miss" if value is None else "hit")
+        if value is not None:
+            return value
+
+        def compute_and_store():
+            value = compute()
+            self.backend.set(key, value, self.ttls[category])
+            return value
+        return self._single_flight(key, compute_and_store)
+
+    def get_or_compute_all(self, user_id: str, compute) -> dict:
+        """
+        Retourne toutes les catégories de recommandations de l'utilisateur. Si une seule catégorie manque
+        dans le cache, compute() recalcule toutes les catégories en une fois et elles sont toutes remises en cache,
+        sauf celles à None (calcul interrompu) qui sont retournées telles quelles
+
+        Args:
+            user_id (str): L'id de l'utilisateur
+            compute: Fonction sans argument qui retourne un dictionnaire catégorie -> recommandation
+        """
+        values = {category: self.backend.get(f"{category}:{user_id}") for category in self.ttls}
+        for category, value in values.items():
+            cache_requests.inc(category=category, result="miss" if value is None else "hit")
+        if all(value is not None for value in values.values()):
+            return values
+
+        def compute_and_store():
+            values = compute()
+            for category, value in values.items():
+                if value is not None:
+                    self.backend.set(f"{category}:{user_id}", value, self.ttls[category])
+            return values
+        return self._single_flight(f"*:{user_id}", compute_and_store)
+
+    def invalidate(self, user_ids: list, categories: list = None) -> None:
+        """
+        Supprime du cache les recommandations des utilisateurs, pour toutes les catégories par défaut
+        """
+        categories = categories or list(self.ttls)
+        self.backend.delete([f"{category}:{user_id}" for user_id in user_ids for category in categories])
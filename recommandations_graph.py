@@ -0,0 +1,283 @@
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Relations projetées en mémoire, toutes partent d'un :Users
+# type de relation -> (requête qui retourne les paires (source, target[, name]), espace des id de la cible)
+PROJECTED_RELATIONSHIPS = {
+    "FRIENDS": ("MATCH (u:Users)-[:FRIENDS]->(v:Users) RETURN u.id AS source, v.id AS target, null AS name", "users"),
+    "HAS_INTEREST": ("MATCH (u:Users)-[:HAS_INTEREST]->(i:Interest) "
+                     "RETURN u.id AS source, i.id AS target, null AS name", "interests"),
+    "MEMBER_OF": ("MATCH (u:Users)-[:MEMBER_OF]->(g:Group) "
+                  "RETURN u.id AS source, g.id AS target, g.name AS name", "groups"),
+    "FOLLOWS": ("MATCH (u:Users)-[:FOLLOWS]->(p:Pages) "
+                "RETURN u.id AS source, p.id AS target, p.name AS name", "pages"),
+}
+
+# Relations d'une liste d'utilisateurs, pour la mise à jour incrémentale de la projection
+REFRESH_QUERY = """
+    UNWIND $user_ids AS user_id
+    MATCH (u:Users {id: user_id})
+    RETURN u.id AS user_id,
+           [(u)-[:FRIENDS]->(v:Users) | [v.id, null]] AS FRIENDS,
+           [(u)-[:HAS_INTEREST]->(i:Interest) | [i.id, null]] AS HAS_INTEREST,
+           [(u)-[:MEMBER_OF]->(g:Group) | [g.id, g.name]] AS MEMBER_OF,
+           [(u)-[:FOLLOWS]->(p:Pages) | [p.id, p.name]] AS FOLLOWS
+"""
+REFRESH_BATCH_SIZE = 1000
+
+class Interner:
+    """
+    Associe à chaque id Neo4j un index entier consécutif (et garde le nom des groupes et des pages)
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.ids = []
+        self.names = []
+
+    def intern(self, node_id, name=None) -> int:
+        position = self.index.get(node_id)
+        if position is None:
+            position = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self.names.append(name)
+        elif name is not None:
+            self.names[position] = name
+        return position
+
+def build_csr(sources: array, targets: array, rows: int) -> tuple:
+    """
+    Construit la matrice d'adjacence au format CSR: les voisins de la ligne i sont indices[indptr[i]:indptr[i + 1]]
+    """
+    sources = np.frombuffer(sources, dtype=np.int32)
+    targets = np.frombuffer(targets, dtype=np.int32)
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=rows), out=indptr[1:])
+    return indptr, targets[np.argsort(sources, kind="stable")]
+
+def gather(csr: tuple, rows) -> "np.ndarray":
+    """
+    Concatène les voisins de plusieurs lignes du CSR sans boucle Python
+    """
+    indptr, indices = csr
+    rows = rows[rows < len(indptr) - 1]
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return indices[offsets]
+
+def top_counts(candidates, exclude, limit: int) -> tuple:
+    """
+    Compte les occurrences de chaque candidat, retire ceux de exclude et garde les limit plus fréquents
+
+    Retourne:
+        tuple: (index des candidats, nombre d'occurrences), par nombre d'occurrences décroissant
+    """
+    values, counts = np.unique(candidates, return_counts=True)
+    keep = ~np.isin(values, exclude)
+    values, counts = values[keep], counts[keep]
+    if len(values) > limit:
+        best = np.argpartition(-counts, limit)[:limit]
+        values, counts = values[best], counts[best]
+    order = np.argsort(-counts, kind="stable")
+    return values[order], counts[order]
+
+class ProjectionState:
+    """
+    Une version de la projection: les CSR chargés depuis Neo4j et les lignes des utilisateurs mis à jour depuis.
+    Une version n'est jamais modifiée après sa création (sauf l'ajout de nouveaux id dans les Interner),
+    les requêtes peuvent donc la lire sans verrou pendant qu'une mise à jour prépare la suivante
+    """
+
+    def __init__(self, spaces: dict, csr: dict, reverse_interests: tuple, overlay: dict):
+        self.spaces = spaces
+        self.csr = csr
+        self.reverse_interests = reverse_interests
+        # Lignes remplacées: type de relation -> {index utilisateur: voisins}
+        self.overlay = overlay
+        self.overlay_keys = {relationship: np.array(sorted(rows), dtype=np.int32)
+                             for relationship, rows in overlay.items()}
+        # Index inverse des intérêts des utilisateurs mis à jour: intérêt -> utilisateurs
+        interest_members = {}
+        for user, interests in overlay["HAS_INTEREST"].items():
+            for interest in interests.tolist():
+                interest_members.setdefault(interest, []).append(user)
+        self.reverse_interests_overlay = {interest: np.array(users, dtype=np.int32)
+                                          for interest, users in interest_members.items()}
+
+    def neighbours(self, relationship: str, users) -> "np.ndarray":
+        """
+        Concatène les voisins de plusieurs utilisateurs, en prenant les lignes mises à jour quand il y en a
+        """
+        users = np.asarray(users, dtype=np.int32)
+        patched = self.overlay_keys[relationship]
+        if not len(patched):
+            return gather(self.csr[relationship], users)
+        is_patched = np.isin(users, patched)
+        parts = [gather(self.csr[relationship], users[~is_patched])]
+        parts += [self.overlay[relationship][user] for user in users[is_patched].tolist()]
+        return np.concatenate(parts)
+
+    def interest_members(self, interests) -> "np.ndarray":
+        """
+        Concatène les utilisateurs qui ont chacun des intérêts (un utilisateur apparaît une fois par intérêt)
+        """
+        members = gather(self.reverse_interests, interests)
+        patched = self.overlay_keys["HAS_INTEREST"]
+        if not len(patched):
+            return members
+        parts = [members[~np.isin(members, patched)]]
+        parts += [self.reverse_interests_overlay[interest] for interest in interests.tolist()
+                  if interest in self.reverse_interests_overlay]
+        return np.concatenate(parts)
+
+class GraphProjection:
+    """
+    Copie en mémoire des relations FRIENDS, HAS_INTEREST, MEMBER_OF et FOLLOWS sous forme de matrices CSR NumPy,
+    pour calculer les recommandations sans requête Neo4j.
+    Les utilisateurs signalés par le middleware de synchronisation sont relus dans Neo4j et leurs lignes remplacées,
+    la projection est entièrement rechargée quand trop de lignes ont été remplacées
+    """
+
+    def __init__(self, graph, rebuild_threshold: int = 100_000):
+        """
+        Args:
+            graph: Le Graph py2neo à projeter
+            rebuild_threshold (int): Nombre de lignes remplacées au-delà duquel la projection est rechargée
+        """
+        if np is None:
+            raise ImportError("Le module numpy est nécessaire pour GraphProjection (pip install numpy)")
+        self.graph = graph
+        self.rebuild_threshold = rebuild_threshold
+        self.lock = threading.Lock()
+        self.state = None
+
+    def load(self) -> None:
+        """
+        Charge toute la projection depuis Neo4j, les requêtes continuent d'utiliser l'ancienne version
+        pendant le chargement
+        """
+        with self.lock:
+            start = time.perf_counter()
+            spaces = {space: Interner() for space in ("users", "interests", "groups", "pages")}
+            users = spaces["users"]
+            for record in self.graph.run("MATCH (u:Users) RETURN u.id AS id"):
+                users.intern(record["id"])
+
+            edges = {}
+            for relationship, (query, space) in PROJECTED_RELATIONSHIPS.items():
+                sources, targets = array("i"), array("i")
+                targets_space = spaces[space]
+                for record in self.graph.run(query):
+                    sources.append(users.intern(record["source"]))
+                    targets.append(targets_space.intern(record["target"], record["name"]))
+                edges[relationship] = (sources, targets)
+
+            csr = {relationship: build_csr(sources, targets, len(users.ids))
+                   for relationship, (sources, targets) in edges.items()}
+            sources, targets = edges["HAS_INTEREST"]
+            reverse_interests = build_csr(targets, sources, len(spaces["interests"].ids))
+            self.state = ProjectionState(spaces, csr, reverse_interests,
+                                         {relationship: {} for relationship in PROJECTED_RELATIONSHIPS})
+            print(f"Projection chargée: {len(users.ids)} utilisateurs, "
+                  f"{sum(len(indices) for _, indices in csr.values())} relations "
+                  f"en {time.perf_counter() - start:.1f}s")
+
+    def reload_every(self, interval: float) -> threading.Thread:
+        """
+        Recharge toute la projection toutes les interval secondes dans un thread en arrière-plan
+        (prend en compte les changements de nom des groupes et des pages, qui ne sont pas signalés)
+        """
+        def reload_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.load()
+                except Exception as error:
+                    print(f"Erreur pendant le rechargement de la projection: {error}")
+        thread = threading.Thread(target=reload_loop, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self, user_ids: list) -> None:
+        """
+        Relit dans Neo4j les relations des utilisateurs et remplace leurs lignes dans une nouvelle version
+        de la projection (les utilisateurs supprimés n'ont plus de relations)
+        """
+        records = []
+        for start in range(0, len(user_ids), REFRESH_BATCH_SIZE):
+            records += self.graph.run(REFRESH_QUERY, user_ids=user_ids[start:start + REFRESH_BATCH_SIZE]).data()
+
+        with self.lock:
+            state = self.state
+            if state is None:
+                return
+            overlay = {relationship: dict(rows) for relationship, rows in state.overlay.items()}
+            found = set()
+            for record in records:
+                user = state.spaces["users"].intern(record["user_id"])
+                found.add(record["user_id"])
+                for relationship, (_, space) in PROJECTED_RELATIONSHIPS.items():
+                    targets_space = state.spaces[space]
+                    overlay[relationship][user] = np.array(
+                        [targets_space.intern(target, name) for target, name in record[relationship]], dtype=np.int32)
+            for user_id in set(user_ids) - found:
+                user = state.spaces["users"].index.get(user_id)
+                if user is not None:
+                    for relationship in PROJECTED_RELATIONSHIPS:
+                        overlay[relationship][user] = np.array([], dtype=np.int32)
+
+            if sum(len(rows) for rows in overlay.values()) <= self.rebuild_threshold:
+                self.state = ProjectionState(state.spaces, state.csr, state.reverse_interests, overlay)
+                return
+        self.load()
+
+    def recommend(self, user_id: str, limit: int) -> dict:
+        """
+        Calcule les quatre catégories de recommandations de l'utilisateur, dans le même format
+        que les requêtes Cypher de recommandations.py
+
+        Retourne:
+            dict: Les recommandations par catégorie (by_common_friends, by_common_interests, groups, pages)
+        """
+        state = self.state
+        users = state.spaces["users"]
+        user = users.index.get(user_id)
+        if user is None:
+            return {"by_common_friends": [], "by_common_interests": [], "groups": [], "pages": []}
+
+        user = np.array([user], dtype=np.int32)
+        friends = state.neighbours("FRIENDS", user)
+        not_recommended = np.concatenate([friends, user])
+
+        candidates, counts = top_counts(state.neighbours("FRIENDS", friends), not_recommended, limit)
+        by_common_friends = [{"user_id": users.ids[candidate], "common_friends": int(count)}
+                             for candidate, count in zip(candidates.tolist(), counts.tolist())]
+
+        interests = state.neighbours("HAS_INTEREST", user)
+        candidates, counts = top_counts(state.interest_members(interests), not_recommended, limit)
+        by_common_interests = [{"user_id": users.ids[candidate], "common_interests": int(count)}
+                               for candidate, count in zip(candidates.tolist(), counts.tolist())]
+
+        groups = state.spaces["groups"]
+        candidates, counts = top_counts(state.neighbours("MEMBER_OF", friends),
+                                        state.neighbours("MEMBER_OF", user), limit)
+        group_recommendations = [{"group_id": groups.ids[candidate], "group_name": groups.names[candidate],
+                                  "friends_in_group": int(count)}
+                                 for candidate, count in zip(candidates.tolist(), counts.tolist())]
+
+        pages = state.spaces["pages"]
+        candidates, counts = top_counts(state.neighbours("FOLLOWS", friends),
+                                        state.neighbours("FOLLOWS", user), limit)
+        page_recommendations = [{"page_id": pages.ids[candidate], "page_name": pages.names[candidate],
+                                 "friends_following_page": int(count)}
+                                for candidate, count in zip(candidates.tolist(), counts.tolist())]
+
+        return {"by_common_friends": by_common_friends, "by_common_interests": by_common_interests,
+                "groups": group_recommendations, "pages": page_recommendations}
@@ -0,0 +1,108 @@
+import importlib
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+from bson import Binary, Int64, ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+backup_csv = importlib.import_module("backup-csv")
+
+def uuid(number: int) -> Binary:
+    return Binary(number.to_bytes(16, "big"), 3)
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = mongomock.MongoClient().backup_test
+    monkeypatch.setattr(backup_csv, "db", database)
+    monkeypatch.setattr(backup_csv, "BACKUP_DIR", str(tmp_path))
+    return database
+
+def fill(database) -> None:
+    # Mêmes types que l'application (_id Binary, dates) et que import_data_from_csv (_id ObjectId, dates en texte)
+    database.users.insert_many([
+        {"_id": uuid(1), "username": "jean", "friends": [uuid(2), uuid(3)], "interests": ["sport"],
+         "createdAt": datetime(2024, 9, 20, 3, 37, 12, 123000), "followers": Int64(12)},
+        {"_id": uuid(2), "username": "jane", "friends": [], "bio": None, "createdAt": datetime(2024, 9, 21)},
+        {"_id": ObjectId(), "username": "yassine", "birthdate": "22/12/1976", "createdAt": "01-11-2024",
+         "friends": ["1", "2"]},
+    ])
+    database.posts.insert_many([
+        {"_id": uuid(10), "userId": uuid(1), "likes": [uuid(2)], "score": 1.0,
+         "comments": [{"user_id": uuid(2).hex(), "comment": "Bonjour !"}, {"user_id": uuid(3)}]},
+        {"_id": uuid(11), "userId": uuid(2), "content": "", "createdAt": datetime(2024, 1, 1)},
+    ])
+
+def snapshot(database) -> dict:
+    return {collection: sorted(database[collection].find(), key=lambda document: str(document["_id"]))
+            for collection in backup_csv.BACKUP_COLLECTIONS}
+
+def drop_all(database) -> None:
+    for collection in backup_csv.BACKUP_COLLECTIONS:
+        database[collection].drop()
+
+def test_full_backup_restores_identical_documents(database):
+    fill(database)
+    expected = snapshot(database)
+
+    backup_csv.daily_backup("full")
+    drop_all(database)
+    backup_csv.restore_backup(backup_csv.load_backup_state()["last_backup"])
+
+    assert snapshot(database) == expected
+
+def test_incremental_chain_restores_identical_documents(database):
+    fill(database)
+    backup_csv.daily_backup("full")
+    database.users.update_one({"_id": uuid(2)}, {"$set": {"bio": "modifiée", "updatedAt": datetime.utcnow()}})
+    database.posts.insert_one({"_id": uuid(12), "userId": uuid(1), "createdAt": datetime.utcnow()})
+    # Document importé par import_data_from_csv: date en texte, trouvé grâce à son _id ObjectId
+    database.posts.insert_one({"_id": ObjectId(), "userId": "1", "createdAt": "01-11-2024"})
+    expected = snapshot(database)
+
+    backup_csv.daily_backup("incremental")
+    drop_all(database)
+    backup_csv.restore_backup(backup_csv.load_backup_state()["last_backup"])
+
+    assert snapshot(database) == expected
+
+def test_id_ranges_cover_mixed_id_types(database):
+    # _id Binary de l'application, ObjectId de import_data_from_csv et un _id texte
+    database.users.insert_many([{"_id": uuid(number)} for number in range(5)] +
+                               [{"_id": ObjectId()} for _ in range(4)] + [{"_id": "admin"}])
+
+    counts = [database.users.count_documents(query) for query in backup_csv.id_ranges(database.users, 3)]
+
+    assert sum(counts) == 10
+
+def test_chunked_full_backup_keeps_mixed_id_types(database, monkeypatch):
+    fill(database)
+    database.users.insert_many([{"_id": ObjectId(), "username": f"import {number}"} for number in range(4)])
+    monkeypatch.setattr(backup_csv.id_ranges, "__defaults__", (2,))
+    expected = snapshot(database)
+
+    backup_csv.daily_backup("full")
+    drop_all(database)
+    backup_csv.restore_backup(backup_csv.load_backup_state()["last_backup"])
+
+    assert snapshot(database) == expected
+
+def test_parquet_round_trip_keeps_values_and_types(database, tmp_path):
+    pytest.importorskip("pyarrow")
+    fill(database)
+    # Id en texte de 12 et 16 octets, qui ne doivent pas être relus comme des ObjectId ou des Binary
+    database.pages.insert_many([{"_id": "page-00000000001", "name": "Page", "members": ["user-0000001"]},
+                                {"_id": "user-0000001", "name": None, "createdAt": datetime(2024, 9, 20, 3, 37, 12, 5)}])
+    expected = snapshot(database)
+
+    for collection in backup_csv.BACKUP_COLLECTIONS:
+        backup_csv.export_data_to_parquet(str(tmp_path / f"{collection}.parquet"), collection)
+    drop_all(database)
+    for collection in backup_csv.BACKUP_COLLECTIONS:
+        if os.path.exists(tmp_path / f"{collection}.parquet"):
+            backup_csv.import_data_from_parquet(str(tmp_path / f"{collection}.parquet"), collection)
+
+    assert snapshot(database) == expected